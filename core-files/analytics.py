@@ -0,0 +1,280 @@
+"""
+EngineerQuest RPG - Submission Analytics
+Streaming per-problem / per-test aggregates of judged submissions: pass
+rates, failure kinds (wrong answers, exception types, verdicts) and latency
+sketches, all-time and over a rolling window, in bounded memory
+"""
+
+import math
+import os
+import queue
+import threading
+import time
+
+QUEUE_SIZE = int(os.environ.get("EQ_STATS_QUEUE_SIZE", 10000))  # submissions waiting to be aggregated
+SLOT_SECONDS = int(os.environ.get("EQ_STATS_SLOT_SECONDS", 300))  # rolling-window granularity
+SLOTS = int(os.environ.get("EQ_STATS_SLOTS", 12))                # rolling window = SLOTS * SLOT_SECONDS
+MAX_KINDS = 16  # distinct failure kinds kept per counter; the rest count as "other"
+
+# Latency sketch: log-spaced buckets from 1 µs to ~17 min, 20 per decade (~6% wide)
+SKETCH_MIN_MS = 0.001
+SKETCH_PER_DECADE = 20
+SKETCH_BUCKETS = 9 * SKETCH_PER_DECADE
+QUANTILES = (0.5, 0.9, 0.99)
+
+# =====================
+# LATENCY SKETCH
+# =====================
+class LatencySketch:
+    """HDR-style histogram over fixed log-spaced buckets
+
+    Only buckets that were hit are stored, so a sketch never holds more than
+    SKETCH_BUCKETS counts however many values it has seen. Quantiles are
+    within half a bucket (~3%). Sketches merge by adding counts.
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = {}  # bucket -> count
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        bucket = 0
+        if ms > SKETCH_MIN_MS:
+            bucket = min(int(math.log10(ms / SKETCH_MIN_MS) * SKETCH_PER_DECADE), SKETCH_BUCKETS - 1)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Value at quantile q (bucket midpoint, capped at the max seen)"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                return min(SKETCH_MIN_MS * 10 ** ((bucket + 0.5) / SKETCH_PER_DECADE), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return None
+        summary = {f"p{round(q * 100)}": round(self.quantile(q), 3) for q in QUANTILES}
+        summary.update(count=self.count, mean=round(self.total / self.count, 3), max=round(self.max, 3))
+        return summary
+
+def _count(counter, kind, amount=1):
+    """Add to a failure-kind counter, folding new kinds past MAX_KINDS into "other"
+    (exception names come from submitted code, so they are unbounded)"""
+    if kind not in counter and len(counter) >= MAX_KINDS:
+        kind = "other"
+    counter[kind] = counter.get(kind, 0) + amount
+
+def _top(counter):
+    return dict(sorted(counter.items(), key=lambda kv: -kv[1]))
+
+# =====================
+# AGGREGATES
+# =====================
+class TestStats:
+    """One test of one problem"""
+    __slots__ = ("runs", "failed", "failures", "latency")
+
+    def __init__(self):
+        self.runs = 0
+        self.failed = 0
+        self.failures = {}  # "wrong" / exception name / verdict -> count
+        self.latency = LatencySketch()
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.failed += other.failed
+        for kind, count in other.failures.items():
+            _count(self.failures, kind, count)
+        self.latency.merge(other.latency)
+
+class ProblemStats:
+    """Submissions to one problem and a TestStats per test"""
+    __slots__ = ("submissions", "passed", "results", "tests", "latency")
+
+    def __init__(self):
+        self.submissions = 0
+        self.passed = 0
+        self.results = {}  # judge outcome (passed / partial / failed / verdict / error type) -> count
+        self.tests = []
+        self.latency = LatencySketch()  # whole-suite run time
+
+    def test(self, index):
+        while len(self.tests) <= index:
+            self.tests.append(TestStats())
+        return self.tests[index]
+
+    def add(self, outcome, passed, result):
+        self.submissions += 1
+        self.passed += passed
+        _count(self.results, outcome)
+        timings = result.get("timings_ms") or ()
+        if timings:
+            self.latency.add(sum(timings))
+        outcomes = result.get("outcomes") or ()
+        for index, test_outcome in enumerate(outcomes):
+            stats = self.test(index)
+            stats.runs += 1
+            if index < len(timings):
+                stats.latency.add(timings[index])
+            if test_outcome != "ok":
+                stats.failed += 1
+                _count(stats.failures, test_outcome)
+        if result.get("verdict") and "outcomes" in result:
+            # The test running when the verdict hit (e.g. the operation limit)
+            stats = self.test(len(outcomes))
+            stats.runs += 1
+            stats.failed += 1
+            _count(stats.failures, result["verdict"])
+
+    def merge(self, other):
+        self.submissions += other.submissions
+        self.passed += other.passed
+        for kind, count in other.results.items():
+            _count(self.results, kind, count)
+        for index, stats in enumerate(other.tests):
+            self.test(index).merge(stats)
+        self.latency.merge(other.latency)
+
+    def to_json(self, problem_id, hardest=None):
+        """Summary with every test, or only the `hardest` most-failed ones"""
+        tests = [
+            {
+                "test": index,
+                "runs": t.runs,
+                "failed": t.failed,
+                "fail_rate": round(t.failed / t.runs, 4) if t.runs else None,
+                "failures": _top(t.failures),
+                "latency_ms": t.latency.summary()
+            }
+            for index, t in enumerate(self.tests)
+        ]
+        if hardest is not None:
+            tests = sorted((t for t in tests if t["failed"]), key=lambda t: (-t["fail_rate"], -t["failed"]))[:hardest]
+        return {
+            "problem_id": problem_id,
+            "submissions": self.submissions,
+            "passed": self.passed,
+            "pass_rate": round(self.passed / self.submissions, 4) if self.submissions else None,
+            "results": _top(self.results),
+            "latency_ms": self.latency.summary(),
+            "tests" if hardest is None else "hardest_tests": tests
+        }
+
+# =====================
+# PIPELINE
+# =====================
+class SubmissionStats:
+    """Bounded streaming pipeline from judged submissions to aggregates
+
+    record() only enqueues (never blocks a request); one thread folds the
+    queue into all-time stats and the current slot of a rolling window. When
+    the queue is full, submissions are dropped and counted. Memory depends on
+    the number of problems and tests, never on the number of submissions.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, slot_seconds=SLOT_SECONDS, slots=SLOTS):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self.total = {}                 # problem_id -> ProblemStats (all time)
+        self._ring = [None] * slots     # (slot number, {problem_id -> ProblemStats}) per position
+        self.recorded = 0
+        self.dropped = 0
+        self.started = time.time()
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="submission-stats", daemon=True)
+        self._thread.start()
+
+    def record(self, problem_id, outcome, passed, result, now=None):
+        """Queue one judged submission; outcome is its judge_outcome() label"""
+        try:
+            self._queue.put_nowait((problem_id, outcome, passed, result, time.time() if now is None else now))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._add(*item)
+            finally:
+                self._queue.task_done()
+
+    def _add(self, problem_id, outcome, passed, result, now):
+        slot = int(now // self.slot_seconds)
+        with self._lock:
+            position = slot % self.slots
+            entry = self._ring[position]
+            if entry is None or entry[0] != slot:
+                entry = self._ring[position] = (slot, {})
+            for stats in (self.total, entry[1]):
+                problem = stats.get(problem_id)
+                if problem is None:
+                    problem = stats[problem_id] = ProblemStats()
+                problem.add(outcome, passed, result)
+            self.recorded += 1
+
+    def drain(self):
+        """Block until everything queued so far is aggregated"""
+        self._queue.join()
+
+    def query(self, problem_id=None, window=None, hardest=5, now=None):
+        """Aggregates for every problem (hardest first, with their `hardest`
+        most-failed tests) or one problem with all its tests; `window` limits
+        them to the last `window` seconds, rounded up to whole slots"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if window is None:
+                sources = [self.total]
+            else:
+                slots = min(max(math.ceil(window / self.slot_seconds), 1), self.slots)
+                current = int(now // self.slot_seconds)
+                sources = [e[1] for e in self._ring if e is not None and current - slots < e[0] <= current]
+            merged = {}
+            for source in sources:
+                for pid, stats in source.items():
+                    if problem_id is not None and pid != problem_id:
+                        continue
+                    merged.setdefault(pid, ProblemStats()).merge(stats)
+            recorded, dropped = self.recorded, self.dropped
+
+        if problem_id is not None:
+            problems = [merged[problem_id].to_json(problem_id)] if problem_id in merged else []
+        else:
+            problems = sorted(
+                (stats.to_json(pid, hardest) for pid, stats in merged.items()),
+                key=lambda p: (p["pass_rate"], -p["submissions"])
+            )
+        return {
+            "window_s": None if window is None else slots * self.slot_seconds,
+            "since": round(self.started, 3),
+            "recorded": recorded,
+            "dropped": dropped,
+            "queued": self._queue.qsize(),
+            "problems": problems
+        }
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
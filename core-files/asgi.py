@@ -0,0 +1,338 @@
+"""
+EngineerQuest RPG - ASGI Server
+Production entry point: code submissions and their event streams are served
+on an event loop; every other route runs the Flask app in a bounded thread pool
+
+Usage:
+    uvicorn asgi:app --port 5000    # single process: judge pool, jobs and rankings live in it
+    python asgi.py
+"""
+
+import asyncio
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import server
+from server import CONTENT, JOBS, JUDGE
+
+IO_THREADS = int(os.environ.get("EQ_ASGI_IO_THREADS", 32))          # Flask routes, SQLite, content files
+SSE_KEEPALIVE = float(os.environ.get("EQ_ASGI_SSE_KEEPALIVE", 15.0))  # seconds between idle comments
+WSGI_BUFFER = 16  # response chunks a bridged Flask route may get ahead of its client
+
+# Blocking work handed off by the loop: bridged Flask routes, player store, content files
+IO_POOL = ThreadPoolExecutor(IO_THREADS, thread_name_prefix="eq-io")
+# One thread per judge worker process; submissions beyond that wait on
+# JUDGE_SLOTS as coroutines instead of each parking a thread
+JUDGE_POOL = ThreadPoolExecutor(JUDGE.size, thread_name_prefix="eq-judge")
+JUDGE_SLOTS = asyncio.Semaphore(JUDGE.size)
+
+def blocking(pool, fn, *args):
+    """Await fn(*args) on a thread pool"""
+    return asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+# =====================
+# JUDGING
+# =====================
+async def run_steps(steps):
+    """server.run_steps() without blocking the loop: content reads run on
+    IO_POOL, judge runs on JUDGE_POOL once a JUDGE_SLOTS slot is free"""
+    try:
+        request = next(steps)
+        while True:
+            if request[0] == "judge":
+                async with JUDGE_SLOTS:
+                    value = await blocking(JUDGE_POOL, JUDGE.run, *request[1:])
+            else:
+                value = await blocking(IO_POOL, *request[1:])
+            request = steps.send(value)
+    except StopIteration as done:
+        return done.value
+    finally:
+        steps.close()
+
+async def judge_submission(player_id, data):
+    """server.judge_submission() with file, judge and store access awaited"""
+    catalog = CONTENT.catalog
+    problem = catalog.problems.get(data.get("problem_id", ""))
+    if not problem:
+        return {"error": "Problem not found"}, 404
+
+    code = data.get("code", "")
+    result, performance = await run_steps(server.grade_steps(code, problem))
+    return await blocking(IO_POOL, server.score_submission, player_id, catalog, problem, data.get("zone", ""),
+                          result, performance, code)
+
+# =====================
+# HTTP HELPERS
+# =====================
+def header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+def player_id_of(scope):
+    """Same rule as server.current_player_id(); None means 401"""
+    return server.resolve_player(server.bearer_token(header(scope, b"authorization")),
+                                 header(scope, b"x-player-id"))
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return bytes(body)
+
+async def send_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"access-control-allow-origin", b"*"),
+            *headers
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+# =====================
+# WSGI BRIDGE (every route not served natively)
+# =====================
+def wsgi_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+            if name in environ:
+                value = environ[name] + "," + value
+        environ[name] = value
+    environ["CONTENT_LENGTH"] = str(len(body))  # read in full already, chunked uploads included
+    return environ
+
+def run_wsgi(environ, emit):
+    """Run the Flask app, passing ("start", status, headers), then each body
+    chunk as the app yields it, then None to emit(); stops early once emit()
+    returns False (the client went away)"""
+    try:
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+            return emit
+
+        iterable = server.app(environ, start_response)
+        try:
+            if emit(("start", response["status"], response["headers"])):
+                for chunk in iterable:
+                    if chunk and not emit(chunk):
+                        break
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+    finally:
+        emit(None)
+
+async def wsgi(scope, body, send):
+    """Serve a Flask route from IO_POOL, streaming its body (e.g. the NDJSON
+    rows of /api/admin/grade) as it is produced, with at most WSGI_BUFFER
+    chunks waiting for a slow client"""
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(WSGI_BUFFER)
+    gone = threading.Event()
+
+    def emit(item):
+        if gone.is_set():
+            return False
+        asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+        return not gone.is_set()
+
+    producer = blocking(IO_POOL, run_wsgi, wsgi_environ(scope, body), emit)
+    try:
+        started = False
+        while True:
+            item = await chunks.get()
+            if item is None:
+                break
+            if isinstance(item, tuple):
+                _, status, headers = item
+                await send({"type": "http.response.start", "status": status, "headers": headers})
+                started = True
+            else:
+                await send({"type": "http.response.body", "body": item, "more_body": True})
+        if started:
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        gone.set()
+        while not producer.done():  # unblock an emit() waiting for queue space
+            while not chunks.empty():
+                chunks.get_nowait()
+            await asyncio.sleep(0.01)
+    await producer  # re-raise an error from the app
+
+# =====================
+# NATIVE ROUTES
+# =====================
+async def submit_code(scope, receive, send):
+    """POST /api/submit ("async": true jobs still run on the JOBS threads)"""
+    try:
+        data = json.loads(await read_body(receive))
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return await send_json(send, {"error": "Expected a JSON object"}, 400)
+    player_id = await blocking(IO_POOL, player_id_of, scope)  # a token miss reads the store
+    if player_id is None:
+        return await send_json(send, {"error": "Valid session token required"}, 401,
+                               [(b"www-authenticate", b"Bearer")])
+
+    if not data.get("async"):
+        payload, status = await judge_submission(player_id, data)
+        return await send_json(send, payload, status)
+
+    payload, status = server.queue_submission(player_id, data)
+    headers = [(b"retry-after", server.QUEUE_RETRY_AFTER.encode())] if status == 503 else []
+    await send_json(send, payload, status, headers)
+
+async def get_submission(scope, receive, send, job_id):
+    """GET /api/submit/<job_id>"""
+    job = JOBS.get(job_id)
+    if not job:
+        return await send_json(send, {"error": "Job not found"}, 404)
+    await send_json(send, job.snapshot())
+
+async def wait_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+async def stream_submission(scope, receive, send, job_id):
+    """GET /api/submit/<job_id>/events: server-sent events without a thread per client"""
+    job = JOBS.get(job_id)
+    if not job:
+        return await send_json(send, {"error": "Job not found"}, 404)
+
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    notify = lambda: loop.call_soon_threadsafe(changed.set)
+    job.subscribe(notify)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", b"*")
+            ]
+        })
+        sent = 0
+        while True:
+            changed.clear()
+            batch = job.wait(sent, 0)
+            for event, data in batch:
+                chunk = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+            sent += len(batch)
+            if job.done and sent >= len(job.events):
+                break
+            if batch:
+                continue
+
+            waiter = asyncio.ensure_future(changed.wait())
+            done, _ = await asyncio.wait(
+                {waiter, disconnected}, timeout=SSE_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED
+            )
+            waiter.cancel()
+            if disconnected in done:
+                return
+            if not done:
+                await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        job.unsubscribe(notify)
+        disconnected.cancel()
+
+# (method, path pattern, route label for metrics, handler)
+ROUTES = [
+    ("POST", re.compile(r"/api/submit"), "/api/submit", submit_code),
+    ("GET", re.compile(r"/api/submit/(?P<job_id>[^/]+)"), "/api/submit/<job_id>", get_submission),
+    ("GET", re.compile(r"/api/submit/(?P<job_id>[^/]+)/events"), "/api/submit/<job_id>/events", stream_submission)
+]
+
+# =====================
+# APPLICATION
+# =====================
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await blocking(IO_POOL, JUDGE.start)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await blocking(IO_POOL, JUDGE.shutdown)
+            CONTENT.stop_watching()
+            await blocking(IO_POOL, server.PLAYERS.close)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+
+    for method, pattern, route, handler in ROUTES:
+        match = pattern.fullmatch(scope["path"])
+        if match and scope["method"] == method:
+            break
+    else:
+        # Flask records its own latency in after_request
+        return await wsgi(scope, await read_body(receive), send)
+
+    start = time.perf_counter()
+    status = {}
+
+    async def send_tracked(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        await send(message)
+
+    try:
+        await handler(scope, receive, send_tracked, **match.groupdict())
+    finally:
+        server.HTTP_LATENCY.observe(time.perf_counter() - start, method=method, route=route,
+                                    status=status.get("code", 500))
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,110 @@
+"""
+EngineerQuest RPG - Static Assets
+Pages and scripts held in memory with content-hashed URLs and precompressed
+gzip / brotli variants, built once at startup
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"  # hashed URLs never change content
+REVALIDATE = "no-cache"                            # pages keep their URL; revalidated by ETag
+COMPRESS_MIN_BYTES = 1024                          # smaller files aren't worth an encoding
+
+class Asset:
+    """One file's bytes, its precompressed variants and caching headers"""
+    __slots__ = ("url", "mimetype", "etag", "cache_control", "variants")
+
+    def __init__(self, url, data, cache_control):
+        self.url = url
+        self.mimetype = mimetypes.guess_type(url)[0] or "application/octet-stream"
+        if self.mimetype.startswith("text/") or self.mimetype.endswith("javascript"):
+            self.mimetype += "; charset=utf-8"
+        self.etag = hashlib.sha256(data).hexdigest()[:16]
+        self.cache_control = cache_control
+        self.variants = {None: data}  # Content-Encoding -> body
+        if len(data) >= COMPRESS_MIN_BYTES:
+            self.variants["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(data, quality=11)
+
+    def select(self, accepted):
+        """(body, Content-Encoding or None) for an Accept-Encoding quality lookup
+        (accepted(name) -> q); smallest accepted variant wins"""
+        best = (self.variants[None], None)
+        for encoding, body in self.variants.items():
+            if encoding and accepted(encoding) > 0 and len(body) < len(best[0]):
+                best = (body, encoding)
+        return best
+
+class AssetBundle:
+    """Scripts served from /assets/<name>.<hash>.<ext> and the pages that load them"""
+
+    def __init__(self, root, pages, scripts, prefix="/assets/"):
+        self.root = root
+        self.page_names = tuple(pages)
+        self.script_names = tuple(scripts)
+        self.prefix = prefix
+        self.pages = {}   # file name -> Asset
+        self.assets = {}  # URL -> Asset (this build's scripts and the previous build's)
+        self.urls = {}    # script file name -> its current hashed URL
+        self._latest = {}  # URL -> Asset, this build's scripts only
+        self._fingerprint = None
+        self.load()
+
+    def _read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def _scan(self):
+        return tuple(os.stat(os.path.join(self.root, n)).st_mtime_ns for n in self.page_names + self.script_names)
+
+    def load(self):
+        """(Re)build every asset from disk
+
+        The previous build's scripts stay served until the next load, so a
+        page opened before a reload can still fetch the script it links to.
+        """
+        fingerprint = self._scan()
+        assets, urls = {}, {}
+        for name in self.script_names:
+            data = self._read(name)
+            stem, ext = os.path.splitext(name)
+            url = f"{self.prefix}{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            assets[url] = Asset(url, data, IMMUTABLE)
+            urls[name] = url
+
+        # Point src="game.js" / href="game.js" at the hashed URLs
+        pattern = re.compile(r'((?:src|href)=")(' + "|".join(map(re.escape, urls)) + r')(")') if urls else None
+        pages = {}
+        for name in self.page_names:
+            html = self._read(name).decode("utf-8")
+            if pattern is not None:
+                html = pattern.sub(lambda m: m.group(1) + urls[m.group(2)] + m.group(3), html)
+            pages[name] = Asset("/" + name, html.encode("utf-8"), REVALIDATE)
+
+        # Assets before pages, so a page never links to a URL that isn't served yet
+        self.assets = {**self._latest, **assets}
+        self._latest = assets
+        self.urls = urls
+        self.pages = pages
+        self._fingerprint = fingerprint
+
+    def refresh(self):
+        """Reload if any file changed on disk (for development)"""
+        if self._scan() != self._fingerprint:
+            self.load()
+
+    def page(self, name):
+        return self.pages[name]
+
+    def asset(self, url):
+        return self.assets.get(url)
@@ -0,0 +1,269 @@
+"""
+EngineerQuest RPG - Load Test / Benchmark
+Drives the API with a realistic traffic mix from concurrent simulated players
+and reports per-route latency percentiles and throughput
+
+Usage:
+    python bench.py                               # in-process Flask test client, throwaway DB
+    python bench.py --url http://localhost:5000   # against a running server
+    python bench.py --players 100 --duration 30 --json results.json
+    python bench.py --compare baseline.json       # exit 1 if any route's p95 regressed
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+# =====================
+# TRAFFIC MIX
+# =====================
+# (weight, label) — labels map to request builders below
+MIX = [
+    (30, "player"),
+    (25, "zones"),
+    (25, "mcq_submit"),
+    (20, "code_submit")
+]
+
+# Code submissions against TC_C7 "Max of Two": (weight, kind, source)
+SOLUTIONS = [
+    (60, "correct", "def solve(data):\n    a, b = data\n    return a if a > b else b\n"),
+    (30, "wrong", "def solve(data):\n    a, b = data\n    return a\n"),
+    (10, "slow", (
+        "def solve(data):\n"
+        "    a, b = data\n"
+        "    t = 0\n"
+        "    for i in range(300000):\n"
+        "        t += i\n"
+        "    return a if a > b else b\n"
+    ))
+]
+
+MCQS = [("MCQ_TC_1", 1), ("MCQ_TC_2", 1), ("MCQ_TC_5", 0), ("MCQ_AF_2", 1)]
+MCQ_CORRECT_RATE = 0.7
+
+def pick(weighted, rng):
+    total = sum(w for w, *_ in weighted)
+    r = rng.uniform(0, total)
+    for entry in weighted:
+        r -= entry[0]
+        if r <= 0:
+            return entry
+    return weighted[-1]
+
+def build_request(kind, rng, unique_code):
+    """(route label, method, path, json body | None)"""
+    if kind == "player":
+        return "GET /api/player", "GET", "/api/player", None
+    if kind == "zones":
+        return "GET /api/zones", "GET", "/api/zones", None
+    if kind == "mcq_submit":
+        mcq_id, answer = rng.choice(MCQS)
+        selected = answer if rng.random() < MCQ_CORRECT_RATE else (answer + 1) % 4
+        body = {"mcq_id": mcq_id, "selected": selected, "zone": "training_camp"}
+        return "POST /api/mcq/submit", "POST", "/api/mcq/submit", body
+
+    _, label, code = pick(SOLUTIONS, rng)
+    if unique_code:
+        # A new statement changes the AST, so the result cache can't answer it
+        code += f"_nonce = {rng.getrandbits(48)}\n"
+    body = {"code": code, "problem_id": "TC_C7", "zone": "training_camp"}
+    return f"POST /api/submit ({label})", "POST", "/api/submit", body
+
+# =====================
+# CLIENTS
+# =====================
+class InProcessClient:
+    """Flask test client: measures the app without network overhead"""
+
+    def __init__(self, app, player_id):
+        self.client = app.test_client()
+        self.headers = {"X-Player-Id": player_id}
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body, headers=self.headers)
+        response.get_data()
+        return response.status_code
+
+class HttpClient:
+    """Plain urllib against a running server"""
+
+    def __init__(self, base_url, player_id):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"X-Player-Id": player_id, "Content-Type": "application/json"}
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=self.headers)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except (urllib.error.URLError, OSError):
+            return 0
+
+# =====================
+# RUNNER
+# =====================
+def simulate_player(client, rng, deadline, max_requests, think_time, unique_code, samples, lock):
+    local = []
+    count = 0
+    while time.monotonic() < deadline and (max_requests is None or count < max_requests):
+        _, kind = pick(MIX, rng)
+        label, method, path, body = build_request(kind, rng, unique_code)
+        start = time.perf_counter()
+        status = client.request(method, path, body)
+        local.append((label, status, time.perf_counter() - start))
+        count += 1
+        if think_time:
+            time.sleep(rng.uniform(0, think_time))
+    with lock:
+        samples.extend(local)
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies, statuses, elapsed):
+    """Latency percentiles and throughput; `statuses` counts answers by HTTP
+    status, and failed connections (0) and 4xx / 5xx count as errors"""
+    latencies = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "count": len(latencies),
+        "errors": sum(n for status, n in statuses.items() if status == 0 or status >= 400),
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0
+    }
+
+def report(samples, elapsed):
+    by_route = {}
+    for label, status, latency in samples:
+        latencies, statuses = by_route.setdefault(label, ([], Counter()))
+        latencies.append(latency)
+        statuses[status] += 1
+    routes = {label: summarize(lat, statuses, elapsed) for label, (lat, statuses) in sorted(by_route.items())}
+    overall = summarize(
+        [s[2] for s in samples],
+        sum((statuses for _, statuses in by_route.values()), Counter()),
+        elapsed
+    )
+    return routes, overall
+
+def print_table(routes, overall):
+    header = f"{'route':<34}{'count':>7}{'err':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for label, r in list(routes.items()) + [("TOTAL", overall)]:
+        print(f"{label:<34}{r['count']:>7}{r['errors']:>5}{r['throughput_rps']:>9.1f}"
+              f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['max_ms']:>9.2f}")
+    print("(latencies in ms)")
+
+def compare(routes, baseline_path, tolerance):
+    """Routes whose p95 grew by more than `tolerance` (fraction) vs a previous --json run"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)["routes"]
+    regressions = []
+    for label, base in baseline.items():
+        current = routes.get(label)
+        if current and base["p95_ms"] > 0 and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append((label, base["p95_ms"], current["p95_ms"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="EngineerQuest API load test")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--players", type=int, default=20, help="concurrent simulated players")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="stop each player after N requests")
+    parser.add_argument("--think-time", type=float, default=0.0, help="max random pause between requests (s)")
+    parser.add_argument("--unique-code", action="store_true", help="defeat the judge result cache")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    parser.add_argument("--compare", help="previous --json results to check for p95 regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth for --compare")
+    args = parser.parse_args()
+    # Relative to where bench.py was started, not the app directory it moves to
+    args.json = args.json and os.path.abspath(args.json)
+    args.compare = args.compare and os.path.abspath(args.compare)
+
+    if args.url:
+        make_client = lambda pid: HttpClient(args.url, pid)
+        target = args.url
+    else:
+        # Fresh database so runs are comparable and real players are untouched
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        tmp = tempfile.mkdtemp(prefix="eq-bench-")
+        os.environ["EQ_DB_FILE"] = os.path.join(tmp, "players.db")
+        os.environ["EQ_EVENT_DIR"] = os.path.join(tmp, "events")
+        os.environ["EQ_PLAYER_HEADER"] = "1"  # one player per simulated client
+        import server
+        server.JUDGE.start()
+        make_client = lambda pid: InProcessClient(server.app, pid)
+        target = "in-process"
+
+    samples, lock = [], threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = []
+    for i in range(args.players):
+        rng = random.Random(args.seed * 100003 + i)
+        client = make_client(f"bench-{args.seed}-{i}")
+        threads.append(threading.Thread(
+            target=simulate_player,
+            args=(client, rng, deadline, args.requests, args.think_time, args.unique_code, samples, lock)
+        ))
+
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    routes, overall = report(samples, elapsed)
+    print(f"\n🎮 EngineerQuest benchmark — {target}, {args.players} players, {elapsed:.1f}s\n")
+    print_table(routes, overall)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "meta": {
+                    "target": target,
+                    "players": args.players,
+                    "duration_s": round(elapsed, 3),
+                    "unique_code": args.unique_code,
+                    "seed": args.seed,
+                    "timestamp": time.time()
+                },
+                "routes": routes,
+                "overall": overall
+            }, f, indent=2)
+
+    if args.compare:
+        regressions = compare(routes, args.compare, args.tolerance)
+        for label, before, after in regressions:
+            print(f"⚠️  p95 regression: {label}: {before:.2f}ms → {after:.2f}ms")
+        if regressions:
+            sys.exit(1)
+        print("✅ No p95 regressions")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+EngineerQuest RPG - Catalog Index
+Immutable lookup tables over the MCQ / problem bank, built once at startup
+"""
+
+import hashlib
+import json
+from types import MappingProxyType
+
+from progression import Progression
+
+def to_json(value):
+    """Compact, key-sorted JSON, as Flask's jsonify() encodes it (minus its trailing newline)"""
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+class Catalog:
+    """O(1) id -> item / zone lookups and per-zone ordered id lists"""
+
+    def __init__(self, mcqs, problems, zones, diff_multi, kb=None, ranks=None, version=0, hints=None):
+        mcq_by_id, mcq_zone = {}, {}
+        problem_by_id, problem_zone = {}, {}
+        zone_mcq_ids, zone_problem_ids = {}, {}
+
+        for zone_id, items in mcqs.items():
+            zone_mcq_ids[zone_id] = tuple(m["id"] for m in items)
+            for m in items:
+                mcq_by_id[m["id"]] = m
+                mcq_zone[m["id"]] = zone_id
+
+        for zone_id, items in problems.items():
+            zone_problem_ids[zone_id] = tuple(p["id"] for p in items)
+            for p in items:
+                problem_by_id[p["id"]] = p
+                problem_zone[p["id"]] = zone_id
+
+        # Rank ladder, unlock thresholds and XP tables
+        self.progression = Progression(ranks or (), zones, diff_multi, mcq_by_id, mcq_zone,
+                                       problem_by_id, problem_zone)
+        potential_xp = self.progression.problem_xp
+        mcq_xp = self.progression.mcq_xp
+
+        self.version = version
+        self.kb = MappingProxyType(dict(kb or {}))
+        self.hints = hints  # HintIndex over hints.json, or None
+        self.ranks = self.progression.ranks
+        self.diff_multi = MappingProxyType(dict(diff_multi))
+        self.zones = MappingProxyType(dict(zones))
+        self.mcqs = MappingProxyType(mcq_by_id)
+        self.mcq_zone = MappingProxyType(mcq_zone)
+        self.problems = MappingProxyType(problem_by_id)
+        self.problem_zone = MappingProxyType(problem_zone)
+        self.zone_mcq_ids = MappingProxyType(zone_mcq_ids)
+        self.zone_problem_ids = MappingProxyType(zone_problem_ids)
+        self.zone_mcq_set = MappingProxyType({z: frozenset(ids) for z, ids in zone_mcq_ids.items()})
+        self.zone_problem_set = MappingProxyType({z: frozenset(ids) for z, ids in zone_problem_ids.items()})
+        self.potential_xp = potential_xp
+
+        # Pre-serialized list entries for /api/mcq/<zone> and /api/problems/<zone>,
+        # indexed by the player's solved flag, so a request only joins strings
+        self.mcq_json = MappingProxyType({
+            i: tuple(to_json({**m, "solved": flag, "answer": None, "intelligence_xp": mcq_xp[i]})
+                     for flag in (False, True))
+            for i, m in mcq_by_id.items()
+        })
+        self.problem_json = MappingProxyType({
+            i: tuple(to_json({**p, "solved": flag, "potential_xp": potential_xp[i]}) for flag in (False, True))
+            for i, p in problem_by_id.items()
+        })
+        # Content hash for ETags: stable across restarts, changes with any edit
+        digest = hashlib.sha1(to_json([zones, diff_multi, zone_mcq_ids, zone_problem_ids]).encode())
+        for entries in (self.mcq_json, self.problem_json):
+            for item_id in sorted(entries):
+                digest.update(entries[item_id][0].encode())
+        self.digest = digest.hexdigest()[:16]
+
+    def count_solved(self, zone_set, solved):
+        """How many of a zone's ids are in the `solved` set (iterates the smaller side)"""
+        return len(zone_set & solved)
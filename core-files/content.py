@@ -0,0 +1,188 @@
+"""
+EngineerQuest RPG - Content Pack
+Loads zones, MCQs, problems, ranks and the KB from a directory of JSON files
+and hot-reloads them when the files change
+
+Layout:
+    content/
+        zones.json            {zone_id: {"name", "icon", "unlock_intelligence"[, "xp_scale"]}}  (display order)
+        ranks.json            [{"xp", "name", "symbol"}, ...]  (any order / length)
+        difficulty.json       {difficulty: xp multiplier}
+        kb.json               {kb_key: hint text}
+        hints.json            [{"id", "text", "tags"[, "requires"]}, ...]  (optional, hints retrieved after the KB entry)
+        hints.idx             hint index built by `python hints.py build content/` (memory-mapped;
+                                                  rebuilt in memory if missing or stale)
+        mcqs/<zone_id>.json   [mcq, ...]
+        problems/<zone_id>.json  [problem, ...]   ("tests" are shown to the player)
+        tests/<problem_id>.json  [test, ...]      (optional hidden tests, loaded lazily)
+        perf/<problem_id>.json   {"complexity", "budget_ops", "tests": [{"n", "input", "expected"}, ...]}
+                                                  (optional performance judging, loaded lazily)
+"""
+
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import hints
+import judge
+from catalog import Catalog
+
+RELOAD_INTERVAL = 2.0      # seconds between file-change checks
+TEST_SUITE_CACHE = 256     # packed test suites kept in memory
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _zone_files(folder, zone_ids):
+    """{zone_id: items} for <folder>/<zone_id>.json, in zone order"""
+    result = {}
+    if not os.path.isdir(folder):
+        return result
+    names = {n[:-5] for n in os.listdir(folder) if n.endswith(".json")}
+    for zone_id in list(zone_ids) + sorted(names - set(zone_ids)):
+        if zone_id in names:
+            result[zone_id] = _read_json(os.path.join(folder, zone_id + ".json"))
+    return result
+
+class ContentPack:
+    """Current catalog of a content directory; `catalog` is swapped atomically on reload"""
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._suites = OrderedDict()
+        self._watcher = None
+        self.catalog = None
+        self.reload()
+
+    def load(self):
+        """Build a fresh Catalog from disk (raises on malformed content)"""
+        zones = _read_json(os.path.join(self.path, "zones.json"))
+        kb = _read_json(os.path.join(self.path, "kb.json"))
+        hints_path = os.path.join(self.path, "hints.json")
+        docs = hints.corpus(_read_json(hints_path) if os.path.exists(hints_path) else [])
+        return Catalog(
+            mcqs=_zone_files(os.path.join(self.path, "mcqs"), zones),
+            problems=_zone_files(os.path.join(self.path, "problems"), zones),
+            zones=zones,
+            diff_multi=_read_json(os.path.join(self.path, "difficulty.json")),
+            kb=kb,
+            hints=hints.HintIndex.load(self.path, docs),
+            ranks=_read_json(os.path.join(self.path, "ranks.json")),
+            version=self.version + 1
+        )
+
+    def reload(self):
+        """Re-read the pack; readers keep using the old catalog until the swap"""
+        with self._lock:
+            fingerprint = self._scan()
+            try:
+                catalog = self.load()
+            except Exception:
+                self._fingerprint = fingerprint  # don't retry until the files change again
+                raise
+            self.version = catalog.version
+            self._fingerprint = fingerprint
+            self._suites.clear()
+            self.catalog = catalog
+            return catalog
+
+    def _scan(self):
+        """(path, mtime, size) of every file in the pack"""
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((full, st.st_mtime_ns, st.st_size))
+        entries.sort()
+        return tuple(entries)
+
+    def changed(self):
+        return self._scan() != self._fingerprint
+
+    # ---------------------
+    # Tests
+    # ---------------------
+    def hidden_tests(self, problem_id):
+        """Hidden tests for a problem (empty if it has none)"""
+        path = os.path.join(self.path, "tests", problem_id + ".json")
+        return _read_json(path) if os.path.exists(path) else []
+
+    def tests_for(self, problem):
+        """Visible + hidden tests used to judge a problem"""
+        return problem["tests"] + self.hidden_tests(problem["id"])
+
+    def test_suite(self, problem):
+        """tests_for() packed for the judge, built on first use and LRU-cached"""
+        problem_id = problem["id"]
+        with self._lock:
+            if problem_id in self._suites:
+                self._suites.move_to_end(problem_id)
+                return self._suites[problem_id]
+
+        suite = judge.pack_tests(self.tests_for(problem))
+
+        with self._lock:
+            self._suites[problem_id] = suite
+            while len(self._suites) > TEST_SUITE_CACHE:
+                self._suites.popitem(last=False)
+        return suite
+
+    def performance(self, problem):
+        """(complexity target, budget_ops, packed suite) from perf/<problem_id>.json,
+        or None if the problem is only judged for correctness"""
+        key = ("perf", problem["id"])
+        with self._lock:
+            if key in self._suites:
+                self._suites.move_to_end(key)
+                return self._suites[key]
+
+        path = os.path.join(self.path, "perf", problem["id"] + ".json")
+        spec = None
+        if os.path.exists(path):
+            data = _read_json(path)
+            if data["complexity"] not in judge.COMPLEXITY:
+                raise ValueError(f"{path}: unknown complexity {data['complexity']!r}")
+            spec = (data["complexity"], data.get("budget_ops"), judge.pack_perf_tests(data["tests"]))
+
+        with self._lock:
+            self._suites[key] = spec
+            while len(self._suites) > TEST_SUITE_CACHE:
+                self._suites.popitem(last=False)
+        return spec
+
+    # ---------------------
+    # Hot reload
+    # ---------------------
+    def watch(self, interval=RELOAD_INTERVAL):
+        """Start a daemon thread that reloads the pack when files change"""
+        if self._watcher is not None:
+            return
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                try:
+                    if self.changed():
+                        self.reload()
+                        print(f"📦 Content pack reloaded (v{self.version})")
+                except Exception as e:
+                    # Keep serving the previous catalog until the files are fixed
+                    print(f"⚠️  Content reload failed: {e}", file=sys.stderr)
+
+        self._watcher = (threading.Thread(target=loop, name="content-watch", daemon=True), stop)
+        self._watcher[0].start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher[1].set()
+            self._watcher = None
@@ -0,0 +1,292 @@
+"""
+EngineerQuest RPG - Event Log
+Append-only log of player progress events (MCQ answered, code judged, name
+set, player replaced) written sequentially with group commit
+
+The player store is the snapshot. Each player row records the sequence
+number of the last event it includes, so at startup only the tail of the log
+is replayed. A segment is archived (gzipped under archive/) once every event
+in it has been flushed to the store.
+
+Live and archived segments together are the full history, which can be
+replayed offline without touching the store. A player's first logged event
+is preceded by a "baseline" player_replaced event holding their state at that
+point, so every history replays from scratch.
+
+Usage:
+    python events.py stats events/                   # event counts by type
+    python events.py replay events/ -o players.jsonl  # rebuild every player from the history
+"""
+
+import argparse
+import copy
+import glob
+import gzip
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+
+SEGMENT_BYTES = int(os.environ.get("EQ_EVENT_SEGMENT_MB", 16)) * 1024 * 1024  # roll to a new file past this
+KEEP_ARCHIVE = os.environ.get("EQ_EVENT_ARCHIVE", "1") == "1"  # "0": delete compacted segments instead
+
+# =====================
+# REDUCER
+# =====================
+SOLVED_KEYS = ("solved", "solved_mcq")
+
+class PlayerState(dict):
+    """A player dict that also keeps each solved list as a set (`solved_ids`),
+    so apply() and readers check membership without scanning the lists. It
+    serializes like a plain dict, and copy.deepcopy() copies the sets too."""
+
+    def __init__(self, player=()):
+        super().__init__(player)
+        self.reindex()
+
+    def reindex(self):
+        self.solved_ids = {key: set(self.get(key, ())) for key in SOLVED_KEYS}
+
+def _add_solved(player, key, item_id):
+    """Append item_id to player[key] unless it is already there"""
+    if isinstance(player, PlayerState):
+        if item_id in player.solved_ids[key]:
+            return
+        player.solved_ids[key].add(item_id)
+    elif item_id in player[key]:
+        return
+    player[key].append(item_id)
+
+def _award(player, stat, event):
+    xp = event["xp"]
+    player[stat] += xp
+    home_zone = event["home_zone"]
+    player["zone_xp"][home_zone] = player["zone_xp"].get(home_zone, 0) + xp
+    zone = event["zone"]
+    player["mastery"][zone] = min(100, player["mastery"].get(zone, 0) + event["mastery_gain"])
+    player["rank"] = event["rank"]
+
+def apply(player, event):
+    """Apply one event to a player dict; the only way progress changes, live or on replay
+
+    Events carry their outcomes (XP, mastery gain, resulting rank), so a
+    replay gives the same state whatever the content pack says today.
+    """
+    kind = event["type"]
+    if kind == "mcq_answered":
+        if event["correct"]:
+            _award(player, "intelligence", event)
+            _add_solved(player, "solved_mcq", event["mcq_id"])
+    elif kind == "code_judged":
+        if event["passed"]:
+            _award(player, "coding_power", event)
+            player["accuracy"] = (player["accuracy"] + event["accuracy"]) / 2
+            _add_solved(player, "solved", event["problem_id"])
+    elif kind == "name_set":
+        player["name"] = event["name"]
+    elif kind == "player_replaced":
+        player.clear()
+        player.update(copy.deepcopy(event["player"]))
+        if isinstance(player, PlayerState):
+            player.reindex()
+    else:
+        raise ValueError(f"Unknown event type {kind!r}")
+
+# =====================
+# SEGMENT FILES
+# =====================
+def _segment_name(first_seq):
+    return f"{first_seq:012d}.jsonl"
+
+def _first_seq(path):
+    return int(os.path.basename(path).split(".", 1)[0])
+
+def read_events(path):
+    """Events of one segment (.jsonl or archived .jsonl.gz), in order"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.endswith("\n"):  # a torn last line (crash mid-write) is not an event
+                yield json.loads(line)
+
+def history(path):
+    """Every event still on disk under an event-log directory: archived, then live"""
+    segments = glob.glob(os.path.join(path, "archive", "*.jsonl.gz")) + glob.glob(os.path.join(path, "*.jsonl"))
+    for segment in sorted(segments, key=_first_seq):
+        yield from read_events(segment)
+
+class EventLog:
+    """Sequenced, fsync'd, append-only event files
+
+    append() assigns sequence numbers and queues lines. One writer thread
+    writes everything queued with a single write + fsync (group commit), and
+    wait(seq) blocks until an event is durable.
+    """
+
+    def __init__(self, path, floor=0, segment_bytes=SEGMENT_BYTES, archive=KEEP_ARCHIVE):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.archive = archive
+        os.makedirs(path, exist_ok=True)
+        self._cond = threading.Condition()
+        self._queue = []  # (seq, line) awaiting the writer
+        self._closed = False
+        # `floor`: highest seq already in the store, in case segments were removed
+        self.last_seq = max(self._repair_tail(), floor)
+        self.durable_seq = self.last_seq
+        self._file = self._open_segment(self.last_seq + 1)
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+
+    # ---------------------
+    # Files
+    # ---------------------
+    def segments(self):
+        """Live segment paths, oldest first"""
+        return sorted(glob.glob(os.path.join(self.path, "*.jsonl")), key=_first_seq)
+
+    def _repair_tail(self):
+        """Drop a torn last line from the newest segment; returns its last seq (0 if none)"""
+        segments = self.segments()
+        if not segments:
+            return 0
+        path = segments[-1]
+        with open(path, "rb") as f:
+            data = f.read()
+        good = data[:data.rfind(b"\n") + 1]
+        if len(good) != len(data):
+            with open(path, "r+b") as f:
+                f.truncate(len(good))
+        lines = good.splitlines()
+        return json.loads(lines[-1])["seq"] if lines else _first_seq(path) - 1
+
+    def _open_segment(self, first_seq):
+        segments = self.segments()
+        if segments and os.path.getsize(segments[-1]) < self.segment_bytes:
+            return open(segments[-1], "ab")
+        return open(os.path.join(self.path, _segment_name(first_seq)), "ab")
+
+    # ---------------------
+    # Appending
+    # ---------------------
+    def append(self, player_id, events):
+        """Queue events for a player; returns the seq of the last one"""
+        now = round(time.time(), 3)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Event log is closed")
+            for event in events:
+                self.last_seq += 1
+                record = {"seq": self.last_seq, "ts": now, "player_id": player_id, **event}
+                self._queue.append((self.last_seq, json.dumps(record, separators=(",", ":")) + "\n"))
+            self._cond.notify_all()
+            return self.last_seq
+
+    def wait(self, seq):
+        """Block until every event up to seq is on disk"""
+        with self._cond:
+            while self.durable_seq < seq and not self._closed:
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                batch, self._queue = self._queue, []
+
+            self._file.write("".join(line for _, line in batch).encode("utf-8"))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            last = batch[-1][0]
+            if self._file.tell() >= self.segment_bytes:
+                self._file.close()
+                self._file = open(os.path.join(self.path, _segment_name(last + 1)), "ab")
+
+            with self._cond:
+                self.durable_seq = last
+                self._cond.notify_all()
+
+    def close(self):
+        """Write what is queued and stop the writer"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=10)
+        self._file.close()
+
+    # ---------------------
+    # Replay and compaction
+    # ---------------------
+    def replay(self):
+        """Events in the live segments (everything that may be newer than the store)"""
+        for segment in self.segments():
+            yield from read_events(segment)
+
+    def compact(self, snapshot_seq):
+        """Archive (or delete) live segments whose events are all <= snapshot_seq;
+        the segment being written is never touched"""
+        segments = self.segments()
+        compacted = 0
+        for segment, following in zip(segments, segments[1:]):
+            if _first_seq(following) - 1 > snapshot_seq:
+                break
+            if self.archive:
+                os.makedirs(os.path.join(self.path, "archive"), exist_ok=True)
+                target = os.path.join(self.path, "archive", os.path.basename(segment) + ".gz")
+                with open(segment, "rb") as src, gzip.open(target + ".tmp", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(target + ".tmp", target)
+            os.remove(segment)
+            compacted += 1
+        return compacted
+
+# =====================
+# OFFLINE REPLAY (CLI)
+# =====================
+def main():
+    parser = argparse.ArgumentParser(description="EngineerQuest event-log tools")
+    parser.add_argument("command", choices=["stats", "replay"])
+    parser.add_argument("path", help="event-log directory (EQ_EVENT_DIR)")
+    parser.add_argument("-o", "--output", help="replay: write players here instead of stdout")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        counts, players, last = Counter(), set(), None
+        for event in history(args.path):
+            counts[event["type"]] += 1
+            players.add(event["player_id"])
+            last = event
+        for kind, count in sorted(counts.items()):
+            print(f"{kind:20} {count}")
+        print(f"{len(players)} players, last seq {last['seq'] if last else 0}")
+        return
+
+    # Every history starts with a player_replaced event (baseline, reset or overwrite)
+    players, skipped = {}, set()
+    for event in history(args.path):
+        player = players.get(event["player_id"])
+        if player is None:
+            if event["type"] != "player_replaced":
+                skipped.add(event["player_id"])
+                continue
+            player = players[event["player_id"]] = PlayerState()
+        apply(player, event)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for player_id, player in sorted(players.items()):
+            out.write(json.dumps({"player_id": player_id, **player}) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"✅ Replayed {len(players)} players", file=sys.stderr)
+    if skipped:
+        print(f"⚠️  {len(skipped)} players have no baseline in this history (segments deleted?)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
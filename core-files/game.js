@@ -72,9 +72,38 @@ const elements = {
 // =====================
 // API FUNCTIONS
 // =====================
+// Session token from POST /api/session, kept across page loads
+let sessionToken = localStorage.getItem('eqSessionToken');
+
+async function ensureSession() {
+    if (sessionToken) return;
+    const response = await fetch(`${API_BASE}/session`, { method: 'POST' });
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    sessionToken = (await response.json()).token;
+    localStorage.setItem('eqSessionToken', sessionToken);
+}
+
+async function apiFetch(endpoint, options = {}) {
+    await ensureSession();
+    const send = () => fetch(`${API_BASE}${endpoint}`, {
+        ...options,
+        headers: { ...(options.headers || {}), 'Authorization': `Bearer ${sessionToken}` }
+    });
+    let response = await send();
+    if (response.status === 401) {
+        // Token revoked or the server's database was reset: start over once
+        sessionToken = null;
+        localStorage.removeItem('eqSessionToken');
+        await ensureSession();
+        response = await send();
+    }
+    return response;
+}
+
 async function apiGet(endpoint) {
     try {
-        const response = await fetch(`${API_BASE}${endpoint}`);
+        // Revalidate with the server's ETag: unchanged catalog data comes back as a 304
+        const response = await apiFetch(endpoint, { cache: 'no-cache' });
         if (!response.ok) throw new Error(`HTTP ${response.status}`);
         return await response.json();
     } catch (error) {
@@ -86,7 +115,7 @@ async function apiGet(endpoint) {
 
 async function apiPost(endpoint, data) {
     try {
-        const response = await fetch(`${API_BASE}${endpoint}`, {
+        const response = await apiFetch(endpoint, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -731,17 +760,23 @@ async function submitCode() {
     if (!result) return;
 
     if (!result.success) {
-        showModal("❌", "Battle Failed!", result.explanation, [
+        showModal("❌", result.verdict || "Battle Failed!", result.explanation, [
             { label: "Accuracy", value: Math.round(result.accuracy * 100) + "%" }
         ], "failure");
         return;
     }
 
-    // Victory!
-    showModal("🏆", "Victory!", `You defeated "${currentProblem.title}"!\n\nKeep pushing your limits, warrior!`, [
+    // Victory! (possibly too slow for the problem's complexity target)
+    const perf = result.performance;
+    const stats = [
         { label: "Accuracy", value: Math.round(result.accuracy * 100) + "%" },
         { label: "XP Earned", value: "+" + result.xp_earned }
-    ], "victory");
+    ];
+    if (result.ops) stats.push({ label: "Operations", value: result.ops.reduce((a, b) => a + b, 0).toLocaleString() });
+    if (perf) stats.push({ label: "Complexity", value: perf.estimated || perf.target });
+    showModal("🏆", "Victory!", perf && !perf.passed
+        ? result.explanation
+        : `You defeated "${currentProblem.title}"!\n\nKeep pushing your limits, warrior!`, stats, "victory");
 
     // Reload data
     await loadPlayerData();
@@ -0,0 +1,80 @@
+"""
+EngineerQuest RPG - Batch Grader
+Re-grades stored submissions against the current content pack and writes
+one JSON result per line
+
+Input is JSON lines: {"player_id": ..., "problem_id": ..., "code": ..., "zone": ...}
+("zone" is optional and defaults to the problem's zone)
+
+Usage:
+    python grade.py submissions.jsonl                         # grade in-process, results to stdout
+    python grade.py submissions.jsonl -o results.jsonl --apply-xp
+    python grade.py - --url http://localhost:5000 < submissions.jsonl   # needs the server's EQ_ADMIN_TOKEN
+"""
+
+import argparse
+import json
+import os
+import sys
+import urllib.request
+
+def read_records(path):
+    stream = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8')
+    try:
+        return [json.loads(line) for line in stream if line.strip()]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def grade_in_process(records, apply_xp):
+    """Judge with this machine's cores against the configured player store"""
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    import server
+    server.JUDGE.start()
+    try:
+        yield from server.grade_batch(records, apply_xp)
+    finally:
+        server.JUDGE.shutdown()
+
+def grade_remote(url, records, apply_xp, admin_token=""):
+    """Stream rows from a running server's POST /api/admin/grade"""
+    body = json.dumps({"submissions": records, "apply_xp": apply_xp}).encode()
+    headers = {"Content-Type": "application/json"}
+    if admin_token:
+        headers["X-Admin-Token"] = admin_token
+    req = urllib.request.Request(url.rstrip("/") + "/api/admin/grade", data=body, method="POST", headers=headers)
+    with urllib.request.urlopen(req) as response:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="EngineerQuest batch grader")
+    parser.add_argument("input", help="JSON-lines submissions file ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="write results here instead of stdout")
+    parser.add_argument("--apply-xp", action="store_true", help="award XP, one transaction per player")
+    parser.add_argument("--url", help="grade on a running server instead of in-process")
+    args = parser.parse_args()
+
+    records = read_records(args.input)
+    if args.url:
+        rows = grade_remote(args.url, records, args.apply_xp, os.environ.get("EQ_ADMIN_TOKEN", ""))
+    else:
+        rows = grade_in_process(records, args.apply_xp)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    graded = passed = 0
+    try:
+        for row in rows:
+            out.write(json.dumps(row) + "\n")
+            out.flush()
+            if "index" in row:
+                graded += 1
+                passed += bool(row.get("success"))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"✅ Graded {graded} submissions, {passed} passed", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+EngineerQuest RPG - Hint Retrieval
+BM25 inverted index over the failure hints in hints.json, built offline
+into one flat file whose postings are memory-mapped at startup, and queried
+with features of a failing submission
+
+Usage:
+    python hints.py build content/                      # write content/hints.idx
+    python hints.py query content/ IndexError empty     # top hints for some features
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+
+INDEX_FILE = "hints.idx"
+MAGIC = b"EQHINTS1"
+TOP_K = int(os.environ.get("EQ_HINTS_TOP_K", 2))  # hints per explanation
+K1 = 1.2    # BM25 term-frequency saturation
+B = 0.75    # BM25 length normalization
+TAG_WEIGHT = 3  # a tag counts as this many occurrences of its token
+
+_TOKEN = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "for", "from", "if", "in", "is", "it", "not",
+    "of", "on", "or", "the", "to", "with", "your", "you", "that", "this", "every", "each"
+))
+
+def tokenize(text):
+    """Lowercase word tokens of two or more characters; snake_case keys and
+    feature names stay whole"""
+    return [t for t in _TOKEN.findall(str(text).lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def slug(label):
+    """Feature token for a verdict or label ("Time Limit Exceeded": time_limit_exceeded)"""
+    return "_".join(tokenize(label))
+
+def input_features(value):
+    """Shape words for a failing test's input: empty, single, negative, zero,
+    duplicates, string"""
+    features = []
+    if isinstance(value, (str, list, tuple, dict, set)):
+        if not value:
+            features.append("empty")
+        elif len(value) == 1:
+            features.append("single")
+        if isinstance(value, str):
+            features.append("string")
+            return features
+        items = value.values() if isinstance(value, dict) else value
+        numbers = [x for x in items if isinstance(x, (int, float)) and not isinstance(x, bool)]
+        if any(isinstance(x, str) for x in items):
+            features.append("string")
+        if len(set(numbers)) < len(numbers):
+            features.append("duplicates")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        numbers = [value]
+    else:
+        return features
+    if any(x < 0 for x in numbers):
+        features.append("negative")
+    if any(x == 0 for x in numbers):
+        features.append("zero")
+    return features
+
+# =====================
+# CORPUS
+# =====================
+def corpus(hints):
+    """[(hint id, text, tags, requires)] for hints.json entries. A hint is only
+    retrieved when the query has one of its `requires` tags (default: any tag)."""
+    return [(h["id"], h["text"], list(h.get("tags", ())), list(h.get("requires", h.get("tags", ())))) for h in hints]
+
+def digest(docs):
+    """Identity of a corpus and the scoring parameters, stored in the index"""
+    return hashlib.sha1(json.dumps([docs, K1, B, TAG_WEIGHT], sort_keys=True).encode()).hexdigest()
+
+# =====================
+# INDEX FILE
+# =====================
+# MAGIC | u32 header length | header JSON (padded to 4 bytes)
+#       | offsets u32[terms + 1] | doc ids u32[postings] | weights f32[postings]
+# Term i's postings are doc_ids / weights[offsets[i]:offsets[i + 1]]; a weight
+# is the term's full BM25 contribution to that document.
+def build(docs):
+    """Index file bytes for a corpus"""
+    tokens = []
+    for _, text, tags, _ in docs:
+        doc = tokenize(text)
+        for tag in tags:
+            doc += tokenize(tag) * TAG_WEIGHT
+        tokens.append(doc)
+    n = len(docs)
+    avg_len = sum(map(len, tokens)) / n if n else 0.0
+
+    postings = {}  # term -> [(doc, tf)]
+    for doc, words in enumerate(tokens):
+        counts = {}
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+        for word, tf in counts.items():
+            postings.setdefault(word, []).append((doc, tf))
+
+    terms = sorted(postings)
+    offsets, doc_ids, weights = array('I', [0]), array('I'), array('f')
+    for term in terms:
+        entries = postings[term]
+        idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+        for doc, tf in entries:
+            norm = K1 * (1 - B + B * len(tokens[doc]) / avg_len)
+            doc_ids.append(doc)
+            weights.append(idf * tf * (K1 + 1) / (tf + norm))
+        offsets.append(len(doc_ids))
+
+    header = json.dumps({
+        "digest": digest(docs),
+        "terms": terms,
+        "docs": [[hint_id, text, sorted({t for tag in requires for t in tokenize(tag)})]
+                 for hint_id, text, _, requires in docs]
+    }, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 4)
+    for table in (offsets, doc_ids, weights):
+        if sys.byteorder != "little":
+            table.byteswap()
+    return MAGIC + struct.pack("<I", len(header)) + header + offsets.tobytes() + doc_ids.tobytes() + weights.tobytes()
+
+def write(path, docs):
+    """Build and atomically replace an index file (open mmaps keep the old one)"""
+    data = build(docs)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return len(data)
+
+class HintIndex:
+    """Read-only view of an index file: postings stay in the (mapped) buffer"""
+
+    def __init__(self, buffer):
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a hint index")
+        start = len(MAGIC) + 4
+        (header_len,) = struct.unpack_from("<I", buffer, len(MAGIC))
+        header = json.loads(bytes(buffer[start:start + header_len]))
+        self.digest = header["digest"]
+        self.terms = {term: i for i, term in enumerate(header["terms"])}
+        self.docs = [(hint_id, text, frozenset(requires)) for hint_id, text, requires in header["docs"]]
+        self.texts = {hint_id: text for hint_id, text, _ in self.docs}
+
+        view = memoryview(buffer)
+        position = start + header_len
+        size = (len(self.terms) + 1) * 4
+        self._offsets = view[position:position + size].cast("I")
+        postings = self._offsets[-1] * 4
+        position += size
+        self._doc_ids = view[position:position + postings].cast("I")
+        self._weights = view[position + postings:position + 2 * postings].cast("f")
+        if sys.byteorder != "little":  # the file is little-endian; copy once on big-endian hosts
+            self._offsets, self._doc_ids, self._weights = (
+                _swapped("I", self._offsets), _swapped("I", self._doc_ids), _swapped("f", self._weights)
+            )
+        self._buffer = buffer
+
+    @classmethod
+    def load(cls, folder, docs):
+        """Map folder/hints.idx if it indexes exactly `docs`, else build in memory
+        (and say so: run `python hints.py build` to keep startup cheap)"""
+        path = os.path.join(folder, INDEX_FILE)
+        expected = digest(docs)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            index = cls(mapped)
+            if index.digest == expected:
+                return index
+            print(f"⚠️  {path} is out of date; run `python hints.py build {folder}`", file=sys.stderr)
+        return cls(build(docs))
+
+    def search(self, tokens, k=TOP_K, exclude=(), min_terms=1):
+        """[(hint id, score)] of the k best hints for query tokens that match
+        at least `min_terms` distinct tokens, one of them a required tag"""
+        tokens = set(tokens)
+        scores, matched = {}, {}
+        offsets, doc_ids, weights = self._offsets, self._doc_ids, self._weights
+        for token in tokens:
+            term = self.terms.get(token)
+            if term is None:
+                continue
+            for p in range(offsets[term], offsets[term + 1]):
+                doc = doc_ids[p]
+                scores[doc] = scores.get(doc, 0.0) + weights[p]
+                matched[doc] = matched.get(doc, 0) + 1
+        best = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        docs = self.docs
+        return [
+            (docs[d][0], round(s, 3)) for d, s in best
+            if matched[d] >= min_terms and docs[d][0] not in exclude and not tokens.isdisjoint(docs[d][2])
+        ][:k]
+
+    def text(self, hint_id):
+        return self.texts.get(hint_id)
+
+def _swapped(code, view):
+    table = array(code, view)
+    table.byteswap()
+    return table
+
+# =====================
+# CLI
+# =====================
+def _corpus_from(folder):
+    def read(name, default):
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            return default
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return corpus(read("hints.json", []))
+
+def main():
+    parser = argparse.ArgumentParser(description="EngineerQuest hint index")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("path", help="content directory (hints.json)")
+    parser.add_argument("terms", nargs="*", help="query: feature words")
+    parser.add_argument("-k", type=int, default=TOP_K, help="query: hints to show")
+    parser.add_argument("--min-terms", type=int, default=1, help="query: distinct terms a hint must match")
+    args = parser.parse_args()
+
+    docs = _corpus_from(args.path)
+    if args.command == "build":
+        size = write(os.path.join(args.path, INDEX_FILE), docs)
+        print(f"✅ Indexed {len(docs)} hints into {os.path.join(args.path, INDEX_FILE)} ({size:,} bytes)")
+        return
+
+    index = HintIndex.load(args.path, docs)
+    tokens = tokenize(" ".join(args.terms))
+    start = time.perf_counter()
+    results = index.search(tokens, args.k, min_terms=args.min_terms)
+    elapsed = (time.perf_counter() - start) * 1e6
+    for hint_id, score in results:
+        print(f"{score:8.3f}  {hint_id}")
+        print("          " + index.text(hint_id).replace("\n", "\n          "))
+    print(f"({elapsed:.0f} µs)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
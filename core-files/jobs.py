@@ -0,0 +1,148 @@
+"""
+EngineerQuest RPG - Judge Job Queue
+Bounded queue of asynchronous submissions with pollable / streamable progress
+"""
+
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+JOB_WORKERS = int(os.environ.get("EQ_JOB_WORKERS", os.cpu_count() or 2))
+JOB_QUEUE_SIZE = int(os.environ.get("EQ_JOB_QUEUE_SIZE", 512))     # queued jobs before 503
+JOB_RETENTION = float(os.environ.get("EQ_JOB_RETENTION", 600.0))   # seconds finished jobs stay pollable
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class Job:
+    """One submission; progress events are appended as the judge reports them"""
+
+    def __init__(self, fn):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.status = QUEUED
+        self.events = []      # [(event name, data dict)]
+        self.result = None
+        self.created = time.time()
+        self.finished = None
+        self._cond = threading.Condition()
+        self._listeners = []  # callables run on every new event (ASGI event streams)
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED)
+
+    def emit(self, event, data):
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+        self._notify()
+
+    def _finish(self, status, result):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.finished = time.time()
+            self.events.append((status, result))
+            self._cond.notify_all()
+        self._notify()
+
+    def _notify(self):
+        with self._cond:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def subscribe(self, listener):
+        """Call listener() from the judging thread after each new event,
+        for waiters that can't block a thread on wait()"""
+        with self._cond:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def wait(self, since, timeout):
+        """Events after index `since`, blocking up to `timeout` for new ones"""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > since or self.done, timeout)
+            return self.events[since:]
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "progress": [data for event, data in self.events if event == "test"],
+                "result": self.result
+            }
+
+class JobQueue:
+    """Fixed set of dispatcher threads draining a bounded queue into the judge"""
+
+    def __init__(self, workers=JOB_WORKERS, maxsize=JOB_QUEUE_SIZE, retention=JOB_RETENTION):
+        self.workers = max(1, workers)
+        self.retention = retention
+        self._queue = queue.Queue(maxsize)
+        self._jobs = {}
+        self._finished = deque()  # (finished_at, job_id), oldest first
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def submit(self, fn):
+        """Queue fn(job) -> result; returns the Job, or None if the queue is full"""
+        self._start()
+        self._prune()
+        job = Job(fn)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            return None
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"judge-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.status = RUNNING
+            job.emit("status", {"status": RUNNING})
+            try:
+                job._finish(DONE, job.fn(job))
+            except Exception as e:
+                job._finish(FAILED, {"error": str(e)})
+            with self._lock:
+                self._finished.append((job.finished, job.id))
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            while self._finished and self._finished[0][0] < cutoff:
+                _, job_id = self._finished.popleft()
+                self._jobs.pop(job_id, None)
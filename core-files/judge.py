@@ -0,0 +1,967 @@
+"""
+EngineerQuest RPG - Code Judge
+Pool of pre-forked worker processes that run submissions with an operation
+budget, wall-clock / CPU timeouts and memory limits, against a curated set of
+builtins and whitelisted stdlib modules, behind a static pre-judge that
+rejects code which cannot pass without running it. Workers are also confined
+by the OS: no new processes, few descriptors, no working directory, and an
+unprivileged user when the server runs as root
+"""
+
+import ast
+import builtins
+import hashlib
+import importlib
+import marshal
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, wall-clock timeout still applies
+    resource = None
+try:
+    import pwd
+except ImportError:  # Windows: no users to switch to
+    pwd = None
+
+# =====================
+# JUDGE CONFIG
+# =====================
+JUDGE_WORKERS = int(os.environ.get("EQ_JUDGE_WORKERS", os.cpu_count() or 2))
+WALL_TIMEOUT = float(os.environ.get("EQ_JUDGE_WALL_TIMEOUT", 3.0))   # seconds per submission
+CPU_TIMEOUT = int(os.environ.get("EQ_JUDGE_CPU_TIMEOUT", 2))         # CPU seconds per submission
+MEMORY_LIMIT_MB = int(os.environ.get("EQ_JUDGE_MEMORY_MB", 256))     # address space per worker
+QUEUE_TIMEOUT = float(os.environ.get("EQ_JUDGE_QUEUE_TIMEOUT", 30.0))  # max wait for a free worker
+OP_BUDGET = int(os.environ.get("EQ_JUDGE_OP_BUDGET", 3_000_000))       # metered lines per submission
+MAX_RUNS = int(os.environ.get("EQ_JUDGE_MAX_RUNS", 500))             # submissions before a worker is recycled
+RECYCLE_MB = int(os.environ.get("EQ_JUDGE_RECYCLE_MB", 128))         # resident memory that recycles a worker
+JUDGE_USER = os.environ.get("EQ_JUDGE_USER", "nobody")  # account workers switch to when started as root
+MAX_OPEN_FILES = 16  # descriptors a worker may hold (its pipe, stdio, /proc/self/statm)
+CODE_CACHE_SIZE = 256  # compiled submissions kept per worker
+SUITE_CACHE_SIZE = 64  # packed test suites kept per worker
+RESULT_CACHE_SIZE = int(os.environ.get("EQ_RESULT_CACHE_SIZE", 4096))  # judged submissions kept
+RESULT_CACHE_TTL = float(os.environ.get("EQ_RESULT_CACHE_TTL", 600.0))  # seconds
+ANALYSIS_CACHE_SIZE = int(os.environ.get("EQ_PREJUDGE_CACHE_SIZE", 4096))  # parsed submissions kept
+
+# Performance judging
+PERF_SLACK = 0.5  # growth exponent allowed above the target's before it counts as a miss
+
+# =====================
+# VERDICTS
+# =====================
+# A result without a verdict ran to completion and is scored by accuracy.
+TLE = "Time Limit Exceeded"
+MLE = "Memory Limit Exceeded"
+CRASH = "Runtime Error"
+BUSY = "Judge Busy"
+REJECTED = "Rejected"  # failed the pre-judge; never ran
+
+# =====================
+# TEST SUITES
+# =====================
+class TestSuite:
+    """Packed, immutable tests plus a content hash that workers cache them by;
+    a performance suite also records the input size `n` of each test"""
+    __slots__ = ("key", "tests", "sizes")
+
+    def __init__(self, key, tests, sizes=None):
+        self.key = key
+        self.tests = tests
+        self.sizes = sizes
+
+    def __len__(self):
+        return len(self.tests)
+
+def pack_tests(tests):
+    """Pre-serialize tests once: ((marshalled input | None, expected), ...)
+
+    Each run unmarshals a fresh input, which is much cheaper than deepcopy
+    and still keeps one test's mutations from leaking into the next.
+    """
+    packed = tuple(
+        (None if t["input"] is None else marshal.dumps(t["input"]), t["expected"])
+        for t in tests
+    )
+    return TestSuite(hashlib.sha1(marshal.dumps(packed)).hexdigest(), packed)
+
+def test_input(suite, index):
+    """A fresh copy of one test's input (None for a test without input)"""
+    blob = suite.tests[index][0]
+    return None if blob is None else marshal.loads(blob)
+
+def suite_arities(suite):
+    """Argument counts solve() is called with: 0 for tests without input, else 1"""
+    return frozenset(0 if blob is None else 1 for blob, _ in suite.tests)
+
+def pack_perf_tests(tests):
+    """Like pack_tests() for [{"n", "input", "expected"}, ...], ordered by n"""
+    tests = sorted(tests, key=lambda t: t["n"])
+    suite = pack_tests(tests)
+    sizes = tuple(t["n"] for t in tests)
+    key = hashlib.sha1(marshal.dumps((suite.key, sizes))).hexdigest()
+    return TestSuite(key, suite.tests, sizes)
+
+def _lru_put(cache, key, value, size):
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > size:
+        cache.popitem(last=False)
+
+# =====================
+# SANDBOX RUNTIME
+# =====================
+# Imported here so the forkserver preloads them: a worker's import is a dict lookup
+ALLOWED_MODULES = ("math", "collections", "functools", "heapq", "bisect")
+_MODULES = {name: importlib.import_module(name) for name in ALLOWED_MODULES}
+# What an import exposes: public names only. Private ones and submodules
+# lead to the rest of the interpreter (collections._sys.modules["os"]).
+_EXPORTS = {
+    name: {k: v for k, v in vars(module).items() if not k.startswith("_") and not isinstance(v, types.ModuleType)}
+    for name, module in _MODULES.items()
+}
+
+# No I/O, no introspection, no eval/exec/compile/open
+SAFE_BUILTINS = {name: getattr(builtins, name) for name in (
+    "abs", "all", "any", "bin", "bool", "callable", "chr", "dict", "divmod", "enumerate",
+    "filter", "float", "format", "frozenset", "hash", "hex", "int", "isinstance", "issubclass",
+    "iter", "len", "list", "map", "max", "min", "next", "object", "oct", "ord", "pow", "range",
+    "repr", "reversed", "round", "set", "slice", "sorted", "str", "sum", "tuple", "zip",
+    "__build_class__", "staticmethod", "classmethod", "property", "super",
+    "Exception", "ArithmeticError", "AssertionError", "IndexError", "KeyError", "LookupError",
+    "NotImplementedError", "RecursionError", "RuntimeError", "StopIteration", "TypeError",
+    "ValueError", "ZeroDivisionError"
+)}
+
+def _print(*args, **kwargs):
+    """print() is allowed but goes nowhere; only solve()'s return value is judged"""
+
+def _import(name, globals=None, locals=None, fromlist=(), level=0):
+    """__import__ limited to ALLOWED_MODULES
+
+    Each import gets its own copy of the module's public names (_EXPORTS), so
+    a submission that rebinds math.inf or heapq.heappush doesn't affect the
+    next one.
+    """
+    if level or name not in _MODULES:
+        raise ImportError(f"Module '{name}' is not available (allowed: {', '.join(ALLOWED_MODULES)})")
+    module = _MODULES[name]
+    isolated = types.ModuleType(module.__name__, module.__doc__)
+    isolated.__dict__.update(_EXPORTS[name])
+    return isolated
+
+SAFE_BUILTINS.update(print=_print, __import__=_import)
+
+def sandbox_globals():
+    """Fresh globals for one submission (its own builtins dict, so changes don't persist)"""
+    return {"__builtins__": dict(SAFE_BUILTINS), "__name__": "__submission__"}
+
+# =====================
+# SANDBOXED EXECUTION (runs inside a worker)
+# =====================
+SOURCE_NAME = "<submission>"  # filename submissions are compiled under; only it is metered
+
+_code_cache = OrderedDict()
+
+def _compile(code):
+    """Compile a submission once; identical resubmissions reuse the code object"""
+    key = hashlib.sha1(code.encode("utf-8", "surrogatepass")).digest()
+    program = _code_cache.get(key)
+    if program is None:
+        program = compile(code, SOURCE_NAME, "exec")
+    _lru_put(_code_cache, key, program, CODE_CACHE_SIZE)
+    return program
+
+class OperationLimit(BaseException):
+    """Raised inside submitted code when its operation budget runs out
+    (a BaseException, so `except Exception` in the submission can't swallow it)"""
+
+class Meter:
+    """Deterministic execution meter: counts source lines executed by submitted
+    code (sys.settrace line events), so the count and the budget cut-off are the
+    same however busy the machine is. A builtin call counts as the one line
+    that makes it."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.ops = lambda: 0
+        self.exceeded = lambda: False
+
+    def __enter__(self):
+        budget = self.budget
+        count = 0
+
+        def line(frame, event, arg):
+            nonlocal count
+            if event == "line":
+                count += 1
+                if count > budget:
+                    raise OperationLimit
+            return line
+
+        def call(frame, event, arg):
+            return line if frame.f_code.co_filename == SOURCE_NAME else None
+
+        # Closures rather than attributes: the tracer runs on every line
+        self.ops = lambda: count
+        self.exceeded = lambda: count > budget
+        sys.settrace(call)
+        return self
+
+    def __exit__(self, *exc):
+        sys.settrace(None)
+
+WRONG_ANSWER = "wrong"  # test outcome: returned, but not the expected value
+TEST_PASSED = "ok"
+
+def execute(code, suite, report=None, op_budget=OP_BUDGET):
+    """Execute Python code and run a packed test suite in one batch;
+    report(index, passed, ms) is called after each test if given
+
+    "outcomes" lists each test run: TEST_PASSED, WRONG_ANSWER or the name
+    of the exception solve() raised.
+    """
+    meter = Meter(op_budget)
+    ops = []
+    outcomes = []
+    try:
+        with meter:
+            # One namespace for globals and locals so solve() can call itself
+            env = sandbox_globals()
+            exec(_compile(code), env)
+            solve = env.get("solve")
+            if solve is None:
+                return {"accuracy": 0, "error": "Function solve() not found", "error_type": "NoSolve"}
+
+            passed = 0
+            timings = []
+            clock = time.perf_counter
+            for index, (blob, expected) in enumerate(suite.tests):
+                data = None if blob is None else marshal.loads(blob)
+                ok = False
+                before = meter.ops()
+                start = clock()
+                try:
+                    result = solve() if blob is None else solve(data)
+                    ok = result == expected
+                    outcome = TEST_PASSED if ok else WRONG_ANSWER
+                except MemoryError:
+                    raise
+                except Exception as e:
+                    outcome = type(e).__name__
+                elapsed = round((clock() - start) * 1000, 3)
+                ops.append(meter.ops() - before)
+                if meter.exceeded():
+                    # The submission caught OperationLimit; the verdict stands
+                    raise OperationLimit
+                passed += ok
+                timings.append(elapsed)
+                outcomes.append(outcome)
+                if report is not None:
+                    report(index, ok, elapsed)
+
+        accuracy = passed / len(suite)
+        return {"accuracy": accuracy, "error": None, "timings_ms": timings, "ops": ops, "outcomes": outcomes}
+
+    except OperationLimit:
+        return {
+            "accuracy": 0,
+            "error": f"Operation limit exceeded ({op_budget:,} lines executed)",
+            "verdict": TLE,
+            "ops": ops,
+            "outcomes": outcomes  # the test that hit the limit is the next one
+        }
+    except MemoryError:
+        raise
+    except Exception as e:
+        # Compiling or running the module failed before any test
+        return {"accuracy": 0, "error": str(e), "error_type": type(e).__name__}
+
+def _cpu_seconds_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _resident_mb():
+    """Current resident memory of this process (peak where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _drop_privileges():
+    """Switch to JUDGE_USER when running as root; other users have nothing to drop"""
+    if pwd is None or os.getuid() != 0:
+        return
+    try:
+        user = pwd.getpwnam(JUDGE_USER)
+        uid, gid = user.pw_uid, user.pw_gid
+    except KeyError:
+        uid = gid = 65534  # conventional nobody / nogroup
+    os.setgroups([])
+    os.setgid(gid)
+    os.setuid(uid)
+
+def _confine(memory_limit_mb):
+    """OS-level limits under the Python-level sandbox, applied once per worker
+
+    The worker runs from an emptied, deleted scratch directory (relative
+    paths lead nowhere), as JUDGE_USER when started as root, and may not
+    create processes or hold more than MAX_OPEN_FILES descriptors.
+    """
+    scratch = tempfile.mkdtemp(prefix="eq-judge-")
+    os.chdir(scratch)
+    os.rmdir(scratch)
+    _drop_privileges()
+    if resource is None:
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    for name, value in (("RLIMIT_AS", limit), ("RLIMIT_NPROC", 0), ("RLIMIT_NOFILE", MAX_OPEN_FILES)):
+        if hasattr(resource, name):
+            try:
+                resource.setrlimit(getattr(resource, name), (value, value))
+            except (ValueError, OSError):
+                pass
+
+def _worker_main(conn, cpu_timeout, memory_limit_mb, op_budget):
+    """Worker loop: receive (code, suite key, suite | None, progress), reply with
+    ("test", index, passed, ms) per test when progress is set, then
+    ("done", result, resident MB)
+
+    The server only sends a suite the worker has not cached yet; both sides
+    apply the same LRU updates so their views of the cache stay in step.
+    """
+    suites = OrderedDict()
+    _confine(memory_limit_mb)
+    if resource is not None:
+        _, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        if resource is not None:
+            # RLIMIT_CPU is cumulative, so move the soft limit forward per job.
+            # Exceeding it raises SIGXCPU, which kills the worker.
+            soft = math.ceil(_cpu_seconds_used()) + cpu_timeout
+            if cpu_hard != resource.RLIM_INFINITY:
+                soft = min(soft, cpu_hard)
+            try:
+                resource.setrlimit(resource.RLIMIT_CPU, (soft, cpu_hard))
+            except (ValueError, OSError):
+                pass
+
+        code, key, suite, progress = job
+        if suite is None:
+            suite = suites[key]
+        _lru_put(suites, key, suite, SUITE_CACHE_SIZE)
+        report = (lambda i, ok, ms: conn.send(("test", i, ok, ms))) if progress else None
+        try:
+            result = execute(code, suite, report, op_budget)
+        except MemoryError:
+            result = {"accuracy": 0, "error": "Memory limit exceeded", "verdict": MLE}
+        conn.send(("done", result, _resident_mb()))
+
+# =====================
+# COMPLEXITY (runs in the server)
+# =====================
+# Target -> growth exponent of its operation count in n (log factors count as ~0)
+COMPLEXITY = {
+    "O(1)": 0,
+    "O(log n)": 0,
+    "O(n)": 1,
+    "O(n log n)": 1,
+    "O(n^2)": 2,
+    "O(n^3)": 3
+}
+
+def estimate_growth(sizes, ops):
+    """Least-squares slope of log(operations) against log(n): ~1 for linear,
+    ~2 for quadratic; exponential solutions give large and growing values"""
+    points = [(math.log(n), math.log(max(count, 1))) for n, count in zip(sizes, ops)]
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if var == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+
+def describe_growth(exponent):
+    """Closest complexity label for a measured growth exponent"""
+    for label, target in COMPLEXITY.items():
+        if exponent <= target + PERF_SLACK:
+            return label
+    return "O(2^n) or worse" if exponent > 4 else f"O(n^{exponent:.1f})"
+
+def check_performance(target, budget_ops, sizes, result):
+    """Judge a performance-suite result against a complexity target and an
+    optional operation budget at the largest size (metered, so deterministic)"""
+    report = {"target": target, "budget_ops": budget_ops, "sizes": list(sizes), "ops": result.get("ops")}
+    if result.get("verdict"):
+        return {**report, "passed": False, "estimated": None, "reason": f"{result['verdict']} on large inputs",
+                "cause": "verdict", "verdict": result["verdict"]}
+    if result.get("error") or result["accuracy"] < 1:
+        return {**report, "passed": False, "estimated": None, "reason": "Wrong answer on large inputs",
+                "cause": "wrong_answer"}
+
+    exponent = estimate_growth(sizes, result["ops"])
+    report.update(growth=round(exponent, 2), estimated=describe_growth(exponent))
+    if exponent > COMPLEXITY[target] + PERF_SLACK:
+        return {**report, "passed": False, "reason": f"Work grows like {report['estimated']}, target is {target}",
+                "cause": "growth_exceeded"}
+    if budget_ops is not None and result["ops"][-1] > budget_ops:
+        return {**report, "passed": False, "cause": "budget_exceeded",
+                "reason": f"Largest input took {result['ops'][-1]:,} operations, budget is {budget_ops:,}"}
+    return {**report, "passed": True, "reason": None, "cause": None}
+
+# =====================
+# WORKER POOL (runs in the server)
+# =====================
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" in methods:
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(["judge"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+_main_lock = threading.Lock()
+
+def _start_detached(process):
+    """Start a worker without the parent's main script
+
+    forkserver and spawn children re-import the parent's __main__ from its
+    file (as __mp_main__). For `python server.py` that would open the player
+    database and event log and start the server's threads inside every
+    sandbox. A stub __main__ with no file is put in place while the process
+    starts; workers only need this module.
+    """
+    with _main_lock:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            process.start()
+        finally:
+            sys.modules["__main__"] = main
+
+class _Worker:
+    """One long-lived sandbox process and the server's end of its pipe"""
+
+    def __init__(self, ctx, cpu_timeout, memory_limit_mb, op_budget):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, cpu_timeout, memory_limit_mb, op_budget),
+            daemon=True
+        )
+        _start_detached(self.process)
+        child_conn.close()
+        self.suites = OrderedDict()  # mirror of the worker's suite cache
+        self.runs = 0
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+class JudgePool:
+    """Fixed-size pool of sandbox workers; hung or crashed workers are replaced,
+    and workers are recycled after max_runs jobs or once they grow past recycle_mb"""
+
+    def __init__(self, size=JUDGE_WORKERS, wall_timeout=WALL_TIMEOUT,
+                 cpu_timeout=CPU_TIMEOUT, memory_limit_mb=MEMORY_LIMIT_MB,
+                 queue_timeout=QUEUE_TIMEOUT, op_budget=OP_BUDGET,
+                 max_runs=MAX_RUNS, recycle_mb=RECYCLE_MB):
+        self.size = max(1, size)
+        self.wall_timeout = wall_timeout
+        self.cpu_timeout = cpu_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.queue_timeout = queue_timeout
+        self.op_budget = op_budget
+        self.max_runs = max_runs
+        self.recycle_mb = recycle_mb
+        self.recycled = 0
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._ctx = None
+        self._workers = []
+
+    def start(self):
+        """Fork all workers up front (no-op if already running)"""
+        with self._lock:
+            if self._ctx is not None:
+                return
+            self._ctx = _mp_context()
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+
+    def shutdown(self):
+        """Stop every worker"""
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._ctx = None
+
+    def idle(self):
+        """Workers currently waiting for a job"""
+        return self._idle.qsize()
+
+    def _spawn(self):
+        worker = _Worker(self._ctx, self.cpu_timeout, self.memory_limit_mb, self.op_budget)
+        self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker):
+        worker.kill()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            if self._ctx is None:
+                return None
+            return self._spawn()
+
+    def run(self, code, suite, on_test=None):
+        """Judge code against a pack_tests() suite;
+        returns {"accuracy", "error"[, "timings_ms"][, "verdict"]}
+
+        on_test(index, passed, ms) is called as each test finishes.
+        """
+        self.start()
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty:
+            return {"accuracy": 0, "error": "All judge workers are busy, try again", "verdict": BUSY}
+
+        result, healthy = self._dispatch(worker, code, suite, on_test)
+        if not healthy:
+            worker = self._replace(worker)
+        if worker is not None:
+            self._idle.put(worker)
+        return result
+
+    def _dispatch(self, worker, code, suite, on_test=None):
+        """Send one job to a worker; returns (result, worker_still_usable)"""
+        deadline = time.monotonic() + self.wall_timeout
+        try:
+            cached = suite.key in worker.suites
+            worker.conn.send((code, suite.key, None if cached else suite, on_test is not None))
+            _lru_put(worker.suites, suite.key, True, SUITE_CACHE_SIZE)
+            while worker.conn.poll(max(0, deadline - time.monotonic())):
+                message = worker.conn.recv()
+                if message[0] == "test":
+                    on_test(*message[1:])
+                    continue
+                _, result, resident_mb = message
+                worker.runs += 1
+                if worker.runs >= self.max_runs or resident_mb > self.recycle_mb:
+                    self.recycled += 1
+                    return result, False
+                return result, result.get("verdict") != MLE
+        except (EOFError, OSError):
+            return self._crash_result(worker), False
+
+        if not worker.process.is_alive():
+            return self._crash_result(worker), False
+        return {"accuracy": 0, "error": f"Execution exceeded {self.wall_timeout:g}s", "verdict": TLE}, False
+
+    def _crash_result(self, worker):
+        worker.process.join(timeout=1)
+        exitcode = worker.process.exitcode
+        sigxcpu = getattr(signal, "SIGXCPU", None)
+        if sigxcpu is not None and exitcode == -sigxcpu:
+            return {"accuracy": 0, "error": f"CPU time exceeded {self.cpu_timeout}s", "verdict": TLE}
+        return {"accuracy": 0, "error": f"Worker exited unexpectedly (code {exitcode})", "verdict": CRASH}
+
+# =====================
+# PRE-JUDGE (runs in the server)
+# =====================
+# Builtins missing from SAFE_BUILTINS on purpose
+FORBIDDEN_NAMES = frozenset((
+    "eval", "exec", "compile", "open", "input", "globals", "locals", "vars", "getattr", "setattr",
+    "delattr", "__import__", "__builtins__", "breakpoint", "exit", "quit", "memoryview", "dir", "help"
+))
+# Dunder attributes are refused except these protocol methods (super().__init__(),
+# a.__lt__(b), ...): the rest lead from an object back to classes, frames,
+# globals or the real builtins
+ALLOWED_DUNDERS = frozenset((
+    "__init__", "__name__", "__doc__", "__len__", "__iter__", "__next__", "__contains__", "__getitem__",
+    "__setitem__", "__delitem__", "__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__", "__hash__",
+    "__repr__", "__str__", "__add__", "__sub__", "__mul__", "__bool__", "__call__"
+))
+# Non-dunder attributes of generators, coroutines, frames and tracebacks that lead to frames
+FORBIDDEN_ATTRIBUTES = frozenset((
+    "gi_frame", "gi_code", "cr_frame", "cr_code", "ag_frame", "ag_code", "f_globals", "f_locals", "f_back",
+    "f_builtins", "f_code", "tb_frame", "tb_next"
+))
+# Nodes that make a function's path depend on its input
+_BRANCHES = (ast.If, ast.IfExp, ast.Match, ast.For, ast.AsyncFor, ast.While, ast.Try, getattr(ast, "TryStar", ast.Try),
+             ast.BoolOp, ast.comprehension, ast.Assert)
+_LOOPS = (ast.For, ast.AsyncFor, ast.While)
+_EXITS = (ast.Return, ast.Raise, ast.Yield, ast.YieldFrom)
+_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+
+class Analysis:
+    """What the pre-judge learned from one source text, independent of the problem"""
+    __slots__ = ("normalized", "rejection", "solve", "features")
+
+    def __init__(self, normalized, rejection=None, solve=None, features=frozenset()):
+        self.normalized = normalized  # canonical form for the result cache
+        self.rejection = rejection    # (error_type, message, KB hint or None), or None
+        self.solve = solve            # (required args, max args or None for *args) if solve is a def
+        self.features = features      # AST patterns ("recursion", "nested_loop", ...) for hint retrieval
+
+def _walk_scope(node):
+    """Nodes under `node` that run in its own scope (nested defs, lambdas and classes skipped)"""
+    stack = list(ast.iter_child_nodes(node))
+    while stack:
+        child = stack.pop()
+        yield child
+        if not isinstance(child, _SCOPES):
+            stack.extend(ast.iter_child_nodes(child))
+
+def _loop_exits(loop):
+    """Whether a loop body can leave the loop: a break of its own, return, raise or yield"""
+    stack = [(node, True) for node in loop.body]  # (node, a break here leaves `loop`)
+    while stack:
+        node, own = stack.pop()
+        if isinstance(node, _EXITS) or own and isinstance(node, ast.Break):
+            return True
+        if not isinstance(node, _SCOPES):
+            own = own and not isinstance(node, _LOOPS)
+            stack.extend((child, own) for child in ast.iter_child_nodes(node))
+    return False
+
+def _unbounded_recursion(nodes):
+    """(name, line) of a function that always calls itself before it can
+    return: no branch anywhere in it, and a self-call ahead of any return.
+    Generators and coroutines are skipped: calling one doesn't run its body."""
+    for func in nodes:
+        if not isinstance(func, ast.FunctionDef):
+            continue
+        if any(isinstance(n, (*_BRANCHES, ast.Yield, ast.YieldFrom)) for n in _walk_scope(func)):
+            continue
+        for statement in func.body:  # straight-line code: runs in order
+            for n in _walk_scope(ast.Module([statement], [])):
+                if isinstance(n, ast.Call) and isinstance(n.func, ast.Name) and n.func.id == func.name:
+                    return func.name, n.lineno
+            if isinstance(statement, (ast.Return, ast.Raise)):
+                break
+    return None
+
+def _attribute_refused(attr, private):
+    """Whether an attribute lookup is refused; `private`: whether `_` names are too"""
+    if attr in FORBIDDEN_ATTRIBUTES or private and attr.startswith("_"):
+        return True
+    return attr.startswith("__") and attr.endswith("__") and attr not in ALLOWED_DUNDERS
+
+def _forbidden(nodes):
+    """Message for the first import, name or attribute the sandbox would refuse, or None
+
+    Private (`_`) attributes are refused on anything bound to an imported
+    module, directly or through plain assignments (m = collections). Class
+    patterns (`case C(attr=x)`) look attributes up too; their subject can be
+    anything, so every `_` name is refused there.
+    """
+    bound, modules, aliases = set(), set(), []
+    for n in nodes:
+        if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store):
+            bound.add(n.id)
+        elif isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(n.name)
+        elif isinstance(n, ast.arg):
+            bound.add(n.arg)
+        elif isinstance(n, ast.Import):
+            modules.update((a.asname or a.name).partition(".")[0] for a in n.names)
+        elif isinstance(n, (ast.Assign, ast.AnnAssign, ast.NamedExpr)) and isinstance(n.value, ast.Name):
+            targets = n.targets if isinstance(n, ast.Assign) else [n.target]
+            aliases += [(t.id, n.value.id) for t in targets if isinstance(t, ast.Name)]
+    grew = True
+    while grew:
+        grew = False
+        for name, source in aliases:
+            if source in modules and name not in modules:
+                modules.add(name)
+                grew = True
+    allowed = ", ".join(ALLOWED_MODULES)
+    for node in nodes:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name not in ALLOWED_MODULES:
+                    return f"Line {node.lineno}: module '{alias.name}' is not available (allowed: {allowed})"
+        elif isinstance(node, ast.ImportFrom):
+            if node.level or node.module not in ALLOWED_MODULES:
+                return f"Line {node.lineno}: module '{node.module or '.'}' is not available (allowed: {allowed})"
+            private = next((a.name for a in node.names if a.name.startswith("_")), None)
+            if private:
+                return f"Line {node.lineno}: '{private}' is not available from '{node.module}'"
+        elif isinstance(node, ast.Name) and node.id in FORBIDDEN_NAMES and node.id not in bound:
+            return f"Line {node.lineno}: '{node.id}' is not available in the judge"
+        elif isinstance(node, ast.Attribute):
+            on_module = isinstance(node.value, ast.Name) and node.value.id in modules
+            if _attribute_refused(node.attr, on_module):
+                return f"Line {node.lineno}: attribute '{node.attr}' is not allowed"
+        elif isinstance(node, ast.MatchClass):
+            attr = next((a for a in node.kwd_attrs if _attribute_refused(a, True)), None)
+            if attr is not None:
+                return f"Line {node.lineno}: attribute '{attr}' is not allowed"
+    return None
+
+def _caught(calls, escaped):
+    """Names of functions whose exceptions may be caught: called inside a try
+    with handlers, from a function that is itself caught, or used as a value
+    (called from somewhere the scan can't follow)"""
+    caught = set(escaped)
+    changed = True
+    while changed:
+        changed = False
+        for name, sites in calls.items():
+            if name not in caught and any(guarded or caller in caught for caller, guarded in sites):
+                caught.add(name)
+                changed = True
+    return caught
+
+def _scan(tree):
+    """(code patterns the hint index knows about, line of a `while True:` that
+    can never end or None), in one pass over the tree. A loop is left alone
+    when an exception may be its way out: inside a try with handlers, or in a
+    helper (not solve) with a handler somewhere on a path that calls it."""
+    features = set()
+    returns = {}  # id(function node) -> whether it returns a value
+    endless = []  # (line, name of the enclosing function or None)
+    calls = {}    # function name -> [(calling function's name or None, inside a try with handlers)]
+    callees, escaped = set(), set()  # ids of call targets; names referenced other than by a call
+
+    def visit(node, loops, func, guarded):
+        for n in ast.iter_child_nodes(node):
+            inner_loops, inner_func = loops, func
+            if isinstance(n, _LOOPS):
+                features.add("while" if isinstance(n, ast.While) else "for")
+                if loops:
+                    features.add("nested_loop")
+                inner_loops = loops + 1
+                if isinstance(n, ast.While) and isinstance(n.test, ast.Constant) and n.test.value \
+                        and not guarded and not _loop_exits(n):
+                    endless.append((n.lineno, func and func.name))
+            elif isinstance(n, ast.Try) and n.handlers:
+                visit(n, loops, func, True)
+                continue
+            elif isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if any("cache" in ast.unparse(d) for d in n.decorator_list):
+                    features.add("memo")
+                if any(isinstance(d, (ast.List, ast.Dict, ast.Set)) for d in n.args.defaults + n.args.kw_defaults):
+                    features.add("mutable_default")
+                returns[id(n)] = False
+                inner_loops, inner_func = 0, n
+            elif isinstance(n, (ast.Lambda, ast.ClassDef)):
+                inner_loops, inner_func = 0, None
+            elif isinstance(n, ast.Return) and n.value is not None and func is not None:
+                returns[id(func)] = True
+            elif isinstance(n, ast.Subscript):
+                features.add("slice" if isinstance(n.slice, ast.Slice) else "index")
+            elif isinstance(n, ast.Call):
+                name = n.func.id if isinstance(n.func, ast.Name) else getattr(n.func, "attr", None)
+                callees.add(id(n.func))
+                calls.setdefault(name, []).append((func and func.name, guarded))
+                if func is not None and name == func.name:
+                    features.add("recursion")
+                elif name in ("sorted", "sort"):
+                    features.add("sort")
+                elif name in ("print", "dict", "set"):
+                    features.add(name)
+            elif isinstance(n, (ast.Dict, ast.DictComp)):
+                features.add("dict")
+            elif isinstance(n, (ast.Set, ast.SetComp)):
+                features.add("set")
+            elif isinstance(n, ast.BinOp) and isinstance(n.op, (ast.Div, ast.FloorDiv, ast.Mod)):
+                features.add("division")
+                if isinstance(n.op, ast.Div):
+                    features.add("true_division")
+            elif isinstance(n, (ast.Global, ast.Nonlocal)):
+                features.add("global")
+            elif isinstance(n, (ast.Name, ast.Attribute)) and isinstance(n.ctx, ast.Load) and id(n) not in callees:
+                escaped.add(n.id if isinstance(n, ast.Name) else n.attr)
+            visit(n, inner_loops, inner_func, guarded)
+
+    visit(tree, 0, None, False)
+    for n in tree.body:
+        if isinstance(n, ast.FunctionDef) and n.name == "solve" and not returns.get(id(n)):
+            features.add("noreturn")
+    caught = _caught(calls, escaped)
+    endless = [line for line, name in endless if name is None or name == "solve" or name not in caught]
+    return frozenset(features), min(endless, default=None)
+
+def _solve_signature(tree):
+    """(required, max or None) positional args of the last module-level
+    `def solve`; "unknown" if solve is bound some other way; None if never"""
+    signature = None
+    for node in _walk_scope(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == "solve":
+            if node.lineno >= getattr(signature, "lineno", 0):
+                signature = node
+        elif isinstance(node, ast.Name) and node.id == "solve" and isinstance(node.ctx, ast.Store) \
+                or isinstance(node, ast.alias) and (node.asname or node.name) == "solve":
+            return "unknown"
+    if signature is None:
+        return None
+    args = signature.args
+    positional = len(args.posonlyargs) + len(args.args)
+    if any(d is None for d in args.kw_defaults):
+        return (positional - len(args.defaults), -1)  # a required keyword-only arg: never callable
+    return (positional - len(args.defaults), None if args.vararg else positional)
+
+def _analyze(code):
+    try:
+        tree = ast.parse(code, SOURCE_NAME)
+    except (SyntaxError, ValueError) as e:
+        return Analysis(code, (type(e).__name__, str(e), "general_logic"))
+    normalized = ast.dump(tree)
+    nodes = list(ast.walk(tree))
+    features, endless_line = _scan(tree)
+
+    message = _forbidden(nodes)
+    if message:
+        return Analysis(normalized, ("Forbidden", message, "general_logic"), features=features)
+    solve = _solve_signature(tree)
+    if solve is None:
+        return Analysis(normalized, ("NoSolve", "Function solve() not found", "general_logic"), features=features)
+    if endless_line is not None:
+        return Analysis(normalized, (
+            "InfiniteLoop", f"Line {endless_line}: `while True` with no break, return or raise never ends", None
+        ), features=features)
+    recursion = _unbounded_recursion(nodes)
+    if recursion is not None:
+        name, line = recursion
+        return Analysis(normalized, (
+            "NoBaseCase", f"Line {line}: {name}() calls itself on every path, so it never reaches a base case",
+            "recursion_base_case"
+        ), features=features)
+    return Analysis(normalized, solve=None if solve == "unknown" else solve, features=features)
+
+_analyses = OrderedDict()
+_analyses_lock = threading.Lock()
+
+def analyze(code):
+    """Parse and statically check a submission once; identical source reuses the Analysis"""
+    key = hashlib.sha1(code.encode("utf-8", "surrogatepass")).digest()
+    with _analyses_lock:
+        analysis = _analyses.get(key)
+        if analysis is not None:
+            _analyses.move_to_end(key)
+            return analysis
+    analysis = _analyze(code)
+    with _analyses_lock:
+        _lru_put(_analyses, key, analysis, ANALYSIS_CACHE_SIZE)
+    return analysis
+
+def prejudge(code, suite):
+    """Judge result for code that cannot pass `suite` (never sent to a worker), or None
+
+    Rejects syntax errors, forbidden imports / names / attributes, a missing
+    solve() or one that can't take the tests' arguments, `while True` loops
+    with no way out and recursion with no base case. The result's "hint"
+    names the KB entry that explains the problem (None: the problem's own).
+    """
+    analysis = analyze(code)
+    rejection = analysis.rejection
+    if rejection is None and analysis.solve is not None:
+        required, most = analysis.solve
+        for arity in sorted(suite_arities(suite)):
+            if most == -1 or arity < required or (most is not None and arity > most):
+                call = "solve()" if arity == 0 else "solve(data)"
+                rejection = ("Arity", f"The tests call {call}, which this solve() can't accept", "general_logic")
+                break
+    if rejection is None:
+        return None
+    error_type, message, hint = rejection
+    return {"accuracy": 0, "error": message, "error_type": error_type, "verdict": REJECTED, "hint": hint}
+
+# =====================
+# RESULT CACHE (runs in the server)
+# =====================
+def normalize_source(code):
+    """Canonical form of a submission: the AST dump ignores whitespace and comments"""
+    return analyze(code).normalized
+
+class ResultCache:
+    """LRU + TTL cache of judge results keyed by (problem, suite hash, normalized code)"""
+
+    def __init__(self, size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+
+    def key(self, problem_id, suite, code):
+        digest = hashlib.sha1(normalize_source(code).encode("utf-8", "surrogatepass")).hexdigest()
+        return (problem_id, suite.key, digest)
+
+    def get(self, key):
+        """Cached result or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, result):
+        """Store a result; only complete runs are cached (not TLE / busy / crashes,
+        which depend on server load rather than on the code)"""
+        if result.get("verdict"):
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
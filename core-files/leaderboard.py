@@ -0,0 +1,96 @@
+"""
+EngineerQuest RPG - Leaderboard
+In-memory rankings kept incrementally in sorted lists (O(log n) per update / query)
+"""
+
+import threading
+from itertools import islice
+
+from sortedcontainers import SortedList
+
+class Board:
+    """One ranking: players ordered by score (desc), ties broken by player ID"""
+
+    def __init__(self):
+        self._order = SortedList()  # (-score, player_id)
+        self._scores = {}
+
+    def __len__(self):
+        return len(self._order)
+
+    def set(self, player_id, score):
+        old = self._scores.get(player_id)
+        if old == score:
+            return
+        if old is not None:
+            self._order.remove((-old, player_id))
+        if score is None:
+            self._scores.pop(player_id, None)
+            return
+        self._scores[player_id] = score
+        self._order.add((-score, player_id))
+
+    def score(self, player_id):
+        return self._scores.get(player_id)
+
+    def top(self, limit):
+        """[(position, player_id, score)] for the best `limit` players"""
+        return [(i + 1, pid, -neg) for i, (neg, pid) in enumerate(islice(self._order, limit))]
+
+    def position(self, player_id):
+        """1-based position, or None if the player is not ranked"""
+        score = self._scores.get(player_id)
+        if score is None:
+            return None
+        return self._order.index((-score, player_id)) + 1
+
+    def around(self, player_id, radius):
+        """[(position, player_id, score)] for a player and `radius` neighbours each side"""
+        position = self.position(player_id)
+        if position is None:
+            return []
+        start = max(0, position - 1 - radius)
+        stop = position + radius
+        return [(start + i + 1, pid, -neg) for i, (neg, pid) in enumerate(self._order[start:stop])]
+
+class Leaderboard:
+    """Global total-XP board plus one board per zone (XP earned in that zone)"""
+
+    def __init__(self):
+        self.overall = Board()
+        self.zones = {}
+        self.names = {}
+        self._lock = threading.Lock()
+
+    def load(self, scores, zone_scores):
+        """Build boards from PlayerStore.scores() / zone_scores() once at startup"""
+        with self._lock:
+            for player_id, name, total_xp in scores:
+                self.names[player_id] = name
+                self.overall.set(player_id, total_xp)
+            for player_id, zone, xp in zone_scores:
+                self.zones.setdefault(zone, Board()).set(player_id, xp)
+
+    def update(self, player_id, player):
+        """Re-rank one player after their state changed"""
+        with self._lock:
+            self.names[player_id] = player.get("name", "")
+            self.overall.set(player_id, player.get("intelligence", 0) + player.get("coding_power", 0))
+            zone_xp = player.get("zone_xp", {})
+            for zone in set(zone_xp).union(self.zones):
+                xp = zone_xp.get(zone, 0)
+                board = self.zones.setdefault(zone, Board())
+                board.set(player_id, xp if xp > 0 else None)
+
+    def board(self, zone=None):
+        return self.overall if zone is None else self.zones.get(zone, Board())
+
+    def top(self, limit, zone=None):
+        with self._lock:
+            return self.board(zone).top(limit)
+
+    def around(self, player_id, radius, zone=None):
+        """(position, total ranked, neighbour rows) for one player"""
+        with self._lock:
+            board = self.board(zone)
+            return board.position(player_id), len(board), board.around(player_id, radius)
@@ -0,0 +1,58 @@
+"""
+EngineerQuest RPG - Progression
+Rank ladder, zone unlock thresholds and per-item XP compiled once per content
+version into sorted tuples and dicts, so every lookup is a bisect or a dict hit
+"""
+
+from bisect import bisect_right
+from types import MappingProxyType
+
+class Progression:
+    """O(log n) rank / next-rank / unlocked-zone queries and precomputed XP
+
+    Ranks may be listed in any order and at any length. A zone's optional
+    "xp_scale" multiplies the XP of every MCQ and problem in it.
+    """
+
+    def __init__(self, ranks, zones, diff_multi, mcqs, mcq_zone, problems, problem_zone):
+        ladder = sorted(ranks, key=lambda r: r["xp"])
+        if not ladder:
+            raise ValueError("ranks.json must define at least one rank")
+        self.ranks = tuple(ladder)
+        self.rank_xp = tuple(r["xp"] for r in ladder)
+
+        # Zones by unlock threshold; _unlocked[k] is the set of the first k
+        by_threshold = sorted(zones, key=lambda z: zones[z].get("unlock_intelligence", 0))
+        self.unlock_xp = tuple(zones[z].get("unlock_intelligence", 0) for z in by_threshold)
+        self._unlocked = tuple(frozenset(by_threshold[:k]) for k in range(len(by_threshold) + 1))
+
+        self.zone_scale = MappingProxyType({z: float(zones[z].get("xp_scale", 1.0)) for z in zones})
+        scale = lambda zone_id: self.zone_scale.get(zone_id, 1.0)
+
+        # Unrounded full-accuracy XP, so int(raw * accuracy) rounds exactly as
+        # int(base_xp * multiplier * accuracy) always has
+        self._problem_raw = {
+            i: p["base_xp"] * diff_multi[p["difficulty"]] * scale(problem_zone[i])
+            for i, p in problems.items()
+        }
+        self.problem_xp = MappingProxyType({i: int(raw) for i, raw in self._problem_raw.items()})
+        self.mcq_xp = MappingProxyType({
+            i: int(m["intelligence_xp"] * scale(mcq_zone[i])) for i, m in mcqs.items()
+        })
+
+    def rank(self, total_xp):
+        """Highest rank reached (the first rank below every threshold)"""
+        return self.ranks[max(bisect_right(self.rank_xp, total_xp) - 1, 0)]
+
+    def next_rank(self, total_xp):
+        """Next rank to reach, or None at the top of the ladder"""
+        i = bisect_right(self.rank_xp, total_xp)
+        return self.ranks[i] if i < len(self.ranks) else None
+
+    def unlocked_zones(self, intelligence):
+        """frozenset of zone IDs open at this intelligence"""
+        return self._unlocked[bisect_right(self.unlock_xp, intelligence)]
+
+    def submission_xp(self, problem_id, accuracy=1.0):
+        """XP for solving a problem at the given accuracy"""
+        return int(self._problem_raw[problem_id] * accuracy)
@@ -0,0 +1,209 @@
+"""
+EngineerQuest RPG - Recommender
+Adaptive "next item" picks: an Elo-style skill per player and learned
+difficulty per item choose unsolved items the player should get right about
+TARGET_SUCCESS of the time, and an SM-2-style interval brings solved items
+back for review
+"""
+
+import math
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+TARGET_SUCCESS = 0.7        # predicted success rate new picks aim for
+PLAYER_K = 0.4              # skill step per attempt
+ITEM_K = 0.05               # item rating step per attempt (learned from every player)
+PASS = 0.5                  # outcome (correct / accuracy) that counts as solved
+RETRY_AFTER = 10 * 60       # seconds a failed item rests before it is offered again
+FIRST_INTERVAL = 24 * 3600  # first review a day after a solve
+EASE = 2.5                  # interval growth after a perfect review
+REVIEW_BASE = 0.6           # score of a review that just became due (new picks score 0.3 - 1.0)
+MAX_ATTEMPTS = 2**32 - 1
+CAPACITY = int(os.environ.get("EQ_RECOMMENDER_PLAYERS", 10000))  # players whose history is kept
+
+# Content difficulty -> starting item rating (same scale as player skill, which starts at 0)
+DIFFICULTY_RATING = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+
+# Recommender kind -> player dict key of solved IDs
+KINDS = {"mcq": "solved_mcq", "problem": "solved"}
+
+def expected(skill, rating):
+    """Predicted chance of success (logistic in skill - rating)"""
+    return 1.0 / (1.0 + math.exp(rating - skill))
+
+class ItemBank:
+    """All items of one kind in a catalog version: IDs, zone index lists and
+    learned difficulty ratings, as arrays indexed by position in `ids`"""
+
+    def __init__(self, items, zone_ids, previous=None):
+        self.ids = tuple(items)
+        self.index = {item_id: i for i, item_id in enumerate(self.ids)}
+        self.zones = {zone: array('I', (self.index[i] for i in ids)) for zone, ids in zone_ids.items()}
+        self.ratings = array('d', (DIFFICULTY_RATING.get(items[i].get("difficulty"), 0.0) for i in self.ids))
+        if previous is not None:
+            # Keep what was learned about items that survived a content reload
+            for i, item_id in enumerate(self.ids):
+                j = previous.index.get(item_id)
+                if j is not None:
+                    self.ratings[i] = previous.ratings[j]
+
+class PlayerState:
+    """One player's history with one bank, as arrays parallel to bank.ids"""
+    __slots__ = ("bank", "skill", "attempts", "streak", "last_seen", "interval")
+
+    def __init__(self, bank, skill=0.0):
+        n = len(bank.ids)
+        self.bank = bank
+        self.skill = skill
+        self.attempts = array('I', [0]) * n
+        self.streak = array('I', [0]) * n
+        self.last_seen = array('d', [0.0]) * n   # unix time of the last attempt
+        self.interval = array('d', [0.0]) * n    # seconds from last_seen until the item is due
+
+    def remap(self, bank):
+        """This history re-indexed for a reloaded catalog"""
+        state = PlayerState(bank, self.skill)
+        for i, item_id in enumerate(bank.ids):
+            j = self.bank.index.get(item_id)
+            if j is not None:
+                for name in ("attempts", "streak", "last_seen", "interval"):
+                    getattr(state, name)[i] = getattr(self, name)[j]
+        return state
+
+    def schedule_solved(self, i, now):
+        """First review of an item solved before we saw it being attempted"""
+        self.attempts[i] = max(self.attempts[i], 1)
+        self.streak[i] = max(self.streak[i], 1)
+        self.last_seen[i] = now
+        self.interval[i] = FIRST_INTERVAL
+
+class Recommender:
+    """Per-player skill and item history for MCQs and code problems
+
+    Histories live in memory for the `capacity` most recently active
+    players. A player seen for the first time (or again after eviction or a
+    restart) starts from their solved lists: solved items are scheduled for a
+    first review and skill starts at the mean rating of what they solved.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._digest = None
+        self._banks = {}                # kind -> ItemBank
+        self._states = OrderedDict()    # (player_id, kind) -> PlayerState
+        self._lock = threading.Lock()
+
+    def _bank(self, catalog, kind):
+        """Current bank for `kind`, rebuilt when the catalog changes (caller holds _lock)"""
+        if catalog.digest != self._digest:
+            self._banks = {
+                "mcq": ItemBank(catalog.mcqs, catalog.zone_mcq_ids, self._banks.get("mcq")),
+                "problem": ItemBank(catalog.problems, catalog.zone_problem_ids, self._banks.get("problem"))
+            }
+            self._digest = catalog.digest
+        return self._banks[kind]
+
+    def _state(self, player_id, kind, bank, solved, now):
+        """History for a player, seeded from `solved` on first sight (caller holds _lock)"""
+        key = (player_id, kind)
+        state = self._states.get(key)
+        if state is None:
+            indices = [bank.index[i] for i in solved if i in bank.index]
+            skill = sum(bank.ratings[i] for i in indices) / len(indices) if indices else 0.0
+            state = PlayerState(bank, skill)
+            for i in indices:
+                state.schedule_solved(i, now)
+            self._states[key] = state
+            if len(self._states) > self.capacity * len(KINDS):
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+            if state.bank is not bank:
+                state = self._states[key] = state.remap(bank)
+        return state
+
+    def observe(self, catalog, player_id, kind, item_id, outcome, now=None):
+        """Record an attempt; outcome is 0 / 1 for an MCQ or the accuracy of a submission"""
+        now = time.time() if now is None else now
+        with self._lock:
+            bank = self._bank(catalog, kind)
+            i = bank.index.get(item_id)
+            if i is None:
+                return
+            state = self._state(player_id, kind, bank, (), now)
+            surprise = outcome - expected(state.skill, bank.ratings[i])
+            state.skill += PLAYER_K * surprise
+            bank.ratings[i] -= ITEM_K * surprise
+
+            state.attempts[i] = min(state.attempts[i] + 1, MAX_ATTEMPTS)
+            state.last_seen[i] = now
+            if outcome >= PASS:
+                state.streak[i] += 1
+                if state.streak[i] == 1:
+                    state.interval[i] = FIRST_INTERVAL
+                else:
+                    state.interval[i] *= 1 + (EASE - 1) * outcome
+            else:
+                state.streak[i] = 0
+                state.interval[i] = RETRY_AFTER
+
+    def recommend(self, catalog, player_id, kind, zone, solved, now=None):
+        """Best next item in a zone: (item_id, {"reason", "p_success", "skill"}), or None
+        when everything is solved and no review is due
+
+        Unsolved items score by how close their predicted success is to
+        TARGET_SUCCESS; items failed in the last RETRY_AFTER seconds only come
+        up when nothing else is left. Solved items compete once due for review,
+        scoring higher the more overdue they are.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            bank = self._bank(catalog, kind)
+            state = self._state(player_id, kind, bank, solved, now)
+            ids, ratings, skill = bank.ids, bank.ratings, state.skill
+            attempts, last_seen, interval = state.attempts, state.last_seen, state.interval
+            exp = math.exp
+
+            best, best_score, reason = None, -1.0, None
+            resting, resting_score = None, -1.0
+            for i in bank.zones.get(zone, ()):
+                if ids[i] in solved:
+                    if not attempts[i]:
+                        state.schedule_solved(i, now)
+                        continue
+                    due = last_seen[i] + interval[i]
+                    if now < due:
+                        continue
+                    score = REVIEW_BASE + 0.2 * min((now - due) / interval[i], 2.0)
+                    if score > best_score:
+                        best, best_score, reason = i, score, "review"
+                    continue
+
+                p = 1.0 / (1.0 + exp(ratings[i] - skill))
+                score = 1.0 - abs(p - TARGET_SUCCESS)
+                if attempts[i] and now < last_seen[i] + interval[i]:
+                    if score > resting_score:
+                        resting, resting_score = i, score
+                elif score > best_score:
+                    best, best_score, reason = i, score, "retry" if attempts[i] else "new"
+
+            if best is None:
+                best, reason = resting, "retry"
+            if best is None:
+                return None
+            p = expected(skill, ratings[best])
+            return ids[best], {"reason": reason, "p_success": round(p, 3), "skill": round(skill, 3)}
+
+    def forget(self, player_id):
+        """Drop a player's history (after a reset or a wholesale overwrite)"""
+        with self._lock:
+            for kind in KINDS:
+                self._states.pop((player_id, kind), None)
+
+    def histories(self):
+        """(player, kind) histories held in memory"""
+        with self._lock:
+            return len(self._states)
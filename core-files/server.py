@@ -3,533 +3,118 @@ EngineerQuest RPG - Backend API Server
 Flask-based REST API for the coding RPG game
 """
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, abort, g, jsonify, redirect, request, stream_with_context
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import atexit
+import copy
+import hashlib
 import json
 import os
-import copy
+import secrets
+import time
 
-app = Flask(__name__, static_folder='.', static_url_path='')
-CORS(app)
+import hints
+import judge
+from analytics import SubmissionStats
+from assets import AssetBundle
+from catalog import to_json
+from content import ContentPack
+from events import EventLog, apply as apply_event
+from jobs import JobQueue
+from leaderboard import Leaderboard
+from metrics import Registry
+from recommender import Recommender
+from store import PlayerStore, WriteBehindStore
 
-SAVE_FILE = "player_data.json"
-
-# =====================
-# KNOWLEDGE BASE (RAG CORE)
-# =====================
-KB = {
-    "arrays_second_largest": (
-        "To find the second largest element:\n"
-        "• Track largest and second largest separately\n"
-        "• Handle duplicates carefully\n"
-        "• Do NOT sort unless allowed\n"
-        "• Edge case: array length < 2"
-    ),
-    "recursion_base_case": (
-        "Every recursive function must:\n"
-        "• Have a base case\n"
-        "• Reduce the problem size\n"
-        "• Return the recursive result properly"
-    ),
-    "dp_overlapping": (
-        "Dynamic Programming requires:\n"
-        "• Overlapping subproblems\n"
-        "• Optimal substructure\n"
-        "• Memoization or tabulation"
-    ),
-    "general_logic": (
-        "Check:\n"
-        "• Function returns a value\n"
-        "• Correct variable updates\n"
-        "• All test cases handled"
-    )
-}
+app = Flask(__name__, static_folder=None)  # only the pages and assets routed below are served
+CORS(app)
 
-# =====================
-# MCQ PROBLEMS DATABASE
-# =====================
-MCQS = {
-    "training_camp": [
-        {
-            "id": "MCQ_TC_1",
-            "title": "Python Basic Type",
-            "category": "MCQ",
-            "difficulty": "easy",
-            "question": "What is the type of the result of '3 / 2' in Python 3?",
-            "options": ["int", "float", "decimal", "error"],
-            "answer": 1,  # Index of correct answer (0-based): "float"
-            "intelligence_xp": 10
-        },
-        {
-            "id": "MCQ_TC_2",
-            "title": "List Indexing",
-            "category": "MCQ",
-            "difficulty": "easy",
-            "question": "What does arr[-1] return for arr = [1, 2, 3]?",
-            "options": ["1", "3", "Error", "None"],
-            "answer": 1,  # "3"
-            "intelligence_xp": 10
-        },
-        {
-            "id": "MCQ_TC_3",
-            "title": "OS Paging",
-            "category": "MCQ",
-            "difficulty": "easy",
-            "question": "Which memory management technique divides memory into fixed-size blocks?",
-            "options": ["Segmentation", "Paging", "Swapping", "Compaction"],
-            "answer": 1,  # "Paging"
-            "intelligence_xp": 10
-        },
-        {
-            "id": "MCQ_TC_4",
-            "title": "Thread vs Process",
-            "category": "MCQ",
-            "difficulty": "medium",
-            "question": "Which of the following is shared between threads of the same process?",
-            "options": ["Stack", "Registers", "Heap memory", "Program counter"],
-            "answer": 2,  # "Heap memory"
-            "intelligence_xp": 15
-        },
-        {
-            "id": "MCQ_TC_5",
-            "title": "Big O Notation",
-            "category": "MCQ",
-            "difficulty": "easy",
-            "question": "What is the time complexity of accessing an element in an array by index?",
-            "options": ["O(1)", "O(n)", "O(log n)", "O(n²)"],
-            "answer": 0,  # "O(1)"
-            "intelligence_xp": 10
-        },
-        {
-            "id": "MCQ_TC_6",
-            "title": "Binary Search Requirement",
-            "category": "MCQ",
-            "difficulty": "easy",
-            "question": "What is required for binary search to work?",
-            "options": ["Linked list", "Sorted array", "Hash table", "Queue"],
-            "answer": 1,  # "Sorted array"
-            "intelligence_xp": 10
-        },
-        {
-            "id": "MCQ_TC_7",
-            "title": "Stack Data Structure",
-            "category": "MCQ",
-            "difficulty": "easy",
-            "question": "Which principle does a Stack follow?",
-            "options": ["FIFO", "LIFO", "Random", "Priority"],
-            "answer": 1,  # "LIFO"
-            "intelligence_xp": 10
-        }
-    ],
-    "array_forest": [
-        {
-            "id": "MCQ_AF_1",
-            "title": "Array Memory",
-            "category": "MCQ",
-            "difficulty": "medium",
-            "question": "Which data structure uses contiguous memory allocation?",
-            "options": ["Linked List", "Array", "Tree", "Graph"],
-            "answer": 1,  # "Array"
-            "intelligence_xp": 15
-        },
-        {
-            "id": "MCQ_AF_2",
-            "title": "Array Insertion",
-            "category": "MCQ",
-            "difficulty": "medium",
-            "question": "What is the worst-case time complexity of inserting at the beginning of an array?",
-            "options": ["O(1)", "O(n)", "O(log n)", "O(n²)"],
-            "answer": 1,  # "O(n)"
-            "intelligence_xp": 15
-        },
-        {
-            "id": "MCQ_AF_3",
-            "title": "Two Pointer Technique",
-            "category": "MCQ",
-            "difficulty": "medium",
-            "question": "Two pointer technique is commonly used for?",
-            "options": ["Sorting", "Finding pairs in sorted array", "Tree traversal", "Graph BFS"],
-            "answer": 1,
-            "intelligence_xp": 15
-        }
-    ],
-    "recursion_cave": [
-        {
-            "id": "MCQ_RC_1",
-            "title": "Recursion Base Case",
-            "category": "MCQ",
-            "difficulty": "medium",
-            "question": "What happens if a recursive function has no base case?",
-            "options": ["Returns 0", "Stack overflow", "Returns None", "Runs once"],
-            "answer": 1,  # "Stack overflow"
-            "intelligence_xp": 15
-        },
-        {
-            "id": "MCQ_RC_2",
-            "title": "Tail Recursion",
-            "category": "MCQ",
-            "difficulty": "hard",
-            "question": "What is tail recursion?",
-            "options": [
-                "Recursion at the start",
-                "Recursive call is the last operation",
-                "Two recursive calls",
-                "No base case"
-            ],
-            "answer": 1,
-            "intelligence_xp": 20
-        }
-    ],
-    "dp_castle": [
-        {
-            "id": "MCQ_DP_1",
-            "title": "DP Prerequisites",
-            "category": "MCQ",
-            "difficulty": "hard",
-            "question": "Which property is NOT required for Dynamic Programming?",
-            "options": [
-                "Overlapping subproblems",
-                "Optimal substructure",
-                "Greedy choice property",
-                "Memoization"
-            ],
-            "answer": 2,  # "Greedy choice property"
-            "intelligence_xp": 20
-        },
-        {
-            "id": "MCQ_DP_2",
-            "title": "Fibonacci DP",
-            "category": "MCQ",
-            "difficulty": "medium",
-            "question": "What is the time complexity of Fibonacci using memoization?",
-            "options": ["O(2^n)", "O(n)", "O(n²)", "O(log n)"],
-            "answer": 1,  # "O(n)"
-            "intelligence_xp": 15
-        }
-    ]
-}
+SAVE_FILE = "player_data.json"  # legacy single-player save, imported once
+DB_FILE = os.environ.get("EQ_DB_FILE", "players.db")
+EVENT_DIR = os.environ.get("EQ_EVENT_DIR", "events")  # empty: no event log
+CONTENT_DIR = "content"
+DEFAULT_PLAYER_ID = "local"
+# "1": X-Player-Id is ignored and every player route needs a session token
+REQUIRE_SESSION = os.environ.get("EQ_REQUIRE_SESSION", "0") == "1"
+# "1": requests without a token may pick any player with X-Player-Id (dev / bench only)
+PLAYER_HEADER = os.environ.get("EQ_PLAYER_HEADER", "0") == "1"
+# /api/admin/* needs it in an X-Admin-Token header; unset, those routes are off
+ADMIN_TOKEN = os.environ.get("EQ_ADMIN_TOKEN", "")
 
-# =====================
-# CODE PROBLEMS DATABASE
-# =====================
-PROBLEMS = {
-    "training_camp": [
-        {
-            "id": "TC_C1",
-            "title": "Hello World",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the string 'Hello World'",
-            "code": "def solve():\n    # Return 'Hello World'\n    pass",
-            "tests": [
-                {"input": None, "expected": "Hello World"}
-            ],
-            "base_xp": 20,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "TC_C2",
-            "title": "Add Two Numbers",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the sum of two numbers. Input: [a, b]",
-            "code": "def solve(data):\n    a, b = data\n    # Return a + b\n    pass",
-            "tests": [
-                {"input": [1, 2], "expected": 3},
-                {"input": [10, 20], "expected": 30}
-            ],
-            "base_xp": 30,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "TC_C3",
-            "title": "Even or Odd",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return 'Even' if n is even, 'Odd' if n is odd",
-            "code": "def solve(n):\n    # Return 'Even' or 'Odd'\n    pass",
-            "tests": [
-                {"input": 4, "expected": "Even"},
-                {"input": 7, "expected": "Odd"},
-                {"input": 0, "expected": "Even"}
-            ],
-            "base_xp": 25,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "TC_C4",
-            "title": "Multiply Numbers",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the product of two numbers. Input: [a, b]",
-            "code": "def solve(data):\n    a, b = data\n    # Return a * b\n    pass",
-            "tests": [
-                {"input": [3, 4], "expected": 12},
-                {"input": [5, 0], "expected": 0},
-                {"input": [7, 7], "expected": 49}
-            ],
-            "base_xp": 25,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "TC_C5",
-            "title": "Square a Number",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the square of n (n * n)",
-            "code": "def solve(n):\n    # Return n squared\n    pass",
-            "tests": [
-                {"input": 5, "expected": 25},
-                {"input": 3, "expected": 9},
-                {"input": 0, "expected": 0}
-            ],
-            "base_xp": 20,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "TC_C6",
-            "title": "Absolute Value",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the absolute value of n (without using abs())",
-            "code": "def solve(n):\n    # Return absolute value\n    pass",
-            "tests": [
-                {"input": -5, "expected": 5},
-                {"input": 10, "expected": 10},
-                {"input": 0, "expected": 0}
-            ],
-            "base_xp": 30,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "TC_C7",
-            "title": "Max of Two",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the larger of two numbers. Input: [a, b]",
-            "code": "def solve(data):\n    a, b = data\n    # Return the larger number\n    pass",
-            "tests": [
-                {"input": [5, 3], "expected": 5},
-                {"input": [2, 8], "expected": 8},
-                {"input": [4, 4], "expected": 4}
-            ],
-            "base_xp": 25,
-            "kb_key": "general_logic"
-        }
-    ],
-    "array_forest": [
-        {
-            "id": "AF_C1",
-            "title": "Sum of Array",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the sum of all elements in the array",
-            "code": "def solve(arr):\n    # Your code here\n    pass",
-            "tests": [
-                {"input": [1, 2, 3], "expected": 6},
-                {"input": [10, 20], "expected": 30},
-                {"input": [5], "expected": 5}
-            ],
-            "base_xp": 40,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "AF_C2",
-            "title": "Reverse Array",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the reversed array",
-            "code": "def solve(arr):\n    # Your code here\n    pass",
-            "tests": [
-                {"input": [1, 2, 3], "expected": [3, 2, 1]},
-                {"input": [5, 1], "expected": [1, 5]}
-            ],
-            "base_xp": 50,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "AF_C3",
-            "title": "Find Maximum",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the maximum element in the array",
-            "code": "def solve(arr):\n    # Your code here\n    pass",
-            "tests": [
-                {"input": [3, 1, 2], "expected": 3},
-                {"input": [9, 5, 12], "expected": 12}
-            ],
-            "base_xp": 50,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "AF_C4",
-            "title": "Two Sum",
-            "difficulty": "medium",
-            "type": "code",
-            "desc": "Return indices of two numbers that add up to target. Input: [arr, target]",
-            "code": "def solve(data):\n    arr, target = data\n    # Return [index1, index2]\n    pass",
-            "tests": [
-                {"input": [[2, 7, 11, 15], 9], "expected": [0, 1]},
-                {"input": [[3, 2, 4], 6], "expected": [1, 2]}
-            ],
-            "base_xp": 80,
-            "kb_key": "general_logic"
-        },
-        {
-            "id": "AF_BOSS",
-            "title": "Second Largest",
-            "difficulty": "boss",
-            "type": "code",
-            "desc": "Return the second largest element (handle duplicates)",
-            "code": "def solve(arr):\n    # Example: [9, 9, 8] → 8\n    pass",
-            "tests": [
-                {"input": [1, 2, 3, 4], "expected": 3},
-                {"input": [9, 9, 8], "expected": 8},
-                {"input": [5, 1], "expected": 1}
-            ],
-            "base_xp": 120,
-            "kb_key": "arrays_second_largest"
-        }
-    ],
-    "recursion_cave": [
-        {
-            "id": "RC_C1",
-            "title": "Factorial",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Return the factorial of n using recursion",
-            "code": "def solve(n):\n    # Your recursive code here\n    pass",
-            "tests": [
-                {"input": 5, "expected": 120},
-                {"input": 3, "expected": 6},
-                {"input": 0, "expected": 1}
-            ],
-            "base_xp": 60,
-            "kb_key": "recursion_base_case"
-        },
-        {
-            "id": "RC_C2",
-            "title": "Fibonacci",
-            "difficulty": "medium",
-            "type": "code",
-            "desc": "Return the nth Fibonacci number (0-indexed)",
-            "code": "def solve(n):\n    # 0, 1, 1, 2, 3, 5, 8...\n    pass",
-            "tests": [
-                {"input": 0, "expected": 0},
-                {"input": 5, "expected": 5},
-                {"input": 10, "expected": 55}
-            ],
-            "base_xp": 90,
-            "kb_key": "recursion_base_case"
-        },
-        {
-            "id": "RC_C3",
-            "title": "Sum of Digits",
-            "difficulty": "medium",
-            "type": "code",
-            "desc": "Return sum of all digits using recursion",
-            "code": "def solve(n):\n    # Example: 123 → 6\n    pass",
-            "tests": [
-                {"input": 123, "expected": 6},
-                {"input": 9999, "expected": 36}
-            ],
-            "base_xp": 80,
-            "kb_key": "recursion_base_case"
-        },
-        {
-            "id": "RC_BOSS",
-            "title": "Power Function",
-            "difficulty": "boss",
-            "type": "code",
-            "desc": "Implement pow(base, exp) using recursion. Input: [base, exp]",
-            "code": "def solve(data):\n    base, exp = data\n    # Return base^exp\n    pass",
-            "tests": [
-                {"input": [2, 10], "expected": 1024},
-                {"input": [3, 4], "expected": 81},
-                {"input": [5, 0], "expected": 1}
-            ],
-            "base_xp": 150,
-            "kb_key": "recursion_base_case"
-        }
-    ],
-    "dp_castle": [
-        {
-            "id": "DP_C1",
-            "title": "Climbing Stairs",
-            "difficulty": "easy",
-            "type": "code",
-            "desc": "Count ways to climb n stairs (1 or 2 steps at a time)",
-            "code": "def solve(n):\n    # Return number of ways\n    pass",
-            "tests": [
-                {"input": 2, "expected": 2},
-                {"input": 3, "expected": 3},
-                {"input": 5, "expected": 8}
-            ],
-            "base_xp": 80,
-            "kb_key": "dp_overlapping"
-        },
-        {
-            "id": "DP_C2",
-            "title": "Coin Change",
-            "difficulty": "medium",
-            "type": "code",
-            "desc": "Return minimum coins needed for amount. Input: [coins, amount]",
-            "code": "def solve(data):\n    coins, amount = data\n    # Return min coins or -1\n    pass",
-            "tests": [
-                {"input": [[1, 2, 5], 11], "expected": 3},
-                {"input": [[2], 3], "expected": -1}
-            ],
-            "base_xp": 120,
-            "kb_key": "dp_overlapping"
-        },
-        {
-            "id": "DP_BOSS",
-            "title": "Longest Common Subsequence",
-            "difficulty": "boss",
-            "type": "code",
-            "desc": "Return length of LCS of two strings. Input: [s1, s2]",
-            "code": "def solve(data):\n    s1, s2 = data\n    # Return LCS length\n    pass",
-            "tests": [
-                {"input": ["abcde", "ace"], "expected": 3},
-                {"input": ["abc", "def"], "expected": 0}
-            ],
-            "base_xp": 200,
-            "kb_key": "dp_overlapping"
-        }
-    ]
-}
+# Sandboxed worker processes for /api/submit (started on first use)
+JUDGE = judge.JudgePool()
+# Judge results for resubmitted (normalized) code
+RESULTS = judge.ResultCache()
+# Asynchronous submissions (POST /api/submit with "async": true)
+JOBS = JobQueue(workers=JUDGE.size)
+QUEUE_RETRY_AFTER = "5"  # seconds, sent with 503 when JOBS is full
+PERF_MISS_XP = 0.5       # XP multiplier for correct code that misses its complexity target
+BATCH_MAX_RECORDS = 10000  # submissions per POST /api/admin/grade
+# Per-problem / per-test pass rates, failure kinds and latencies (/api/admin/stats)
+STATS = SubmissionStats()
 
 # =====================
-# ZONES CONFIG
+# METRICS (served at /metrics)
 # =====================
-ZONES = {
-    "training_camp": {"name": "Training Camp", "icon": "🎯", "unlock_intelligence": 0},
-    "array_forest": {"name": "Array Forest", "icon": "🌲", "unlock_intelligence": 50},
-    "recursion_cave": {"name": "Recursion Cave", "icon": "🦇", "unlock_intelligence": 100},
-    "dp_castle": {"name": "DP Castle", "icon": "🏰", "unlock_intelligence": 200}
-}
+METRICS = Registry()
+HTTP_LATENCY = METRICS.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"]
+)
+JUDGE_OUTCOMES = METRICS.counter("judge_results_total", "Judged submissions by outcome", ["outcome"])
+METRICS.callback_counter(
+    "result_cache_requests_total", "Judge result cache lookups", ["result"],
+    lambda: {("hit",): RESULTS.hits, ("miss",): RESULTS.misses}
+)
+METRICS.gauge("result_cache_entries", "Judge results currently cached", lambda: RESULTS.stats()["size"])
+METRICS.gauge("job_queue_depth", "Async submissions waiting for a judge", JOBS.depth)
+METRICS.gauge("judge_idle_workers", "Judge worker processes currently idle", JUDGE.idle)
+METRICS.callback_counter(
+    "judge_workers_recycled_total", "Judge workers replaced after max runs or memory growth", [],
+    lambda: {(): JUDGE.recycled}
+)
+METRICS.gauge("players_dirty", "Players changed in memory but not yet written", lambda: PLAYERS.dirty())
+METRICS.gauge("player_cache_entries", "Players held in memory", lambda: PLAYERS.stats()["size"])
+METRICS.gauge("recommender_histories", "Player histories held by the recommender", lambda: RECOMMENDER.histories())
+METRICS.callback_counter(
+    "player_cache_requests_total", "Player lookups served from memory (hit) or the database (miss)", ["result"],
+    lambda: {("hit",): PLAYERS.hits, ("miss",): PLAYERS.misses}
+)
+METRICS.callback_counter(
+    "submission_stats_dropped_total", "Judged submissions dropped because the analytics queue was full", [],
+    lambda: {(): STATS.dropped}
+)
+METRICS.gauge("event_log_segments", "Event-log segments not yet compacted",
+              lambda: len(EVENTS.segments()) if EVENTS else 0)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_LATENCY.observe(time.perf_counter() - start,
+                             method=request.method, route=route, status=response.status_code)
+    return response
 
 # =====================
-# DIFFICULTY MULTIPLIERS
+# CONTENT PACK (zones, MCQs, problems, ranks, KB)
 # =====================
-DIFF_MULTI = {
-    "easy": 1.0,
-    "medium": 2.0,
-    "hard": 3.5,
-    "boss": 5.0
-}
+# Loaded from content/ and hot-reloaded on change. Handlers read
+# CONTENT.catalog once per request so a reload never mixes two versions.
+CONTENT = ContentPack(CONTENT_DIR)
+CONTENT.watch()
 
 # =====================
-# RANK THRESHOLDS
+# STATIC ASSETS
 # =====================
-RANKS = [
-    {"xp": 0, "name": "Trainee", "symbol": "⚔️"},
-    {"xp": 100, "name": "Operative", "symbol": "🔰"},
-    {"xp": 300, "name": "Coder", "symbol": "🗡️"},
-    {"xp": 600, "name": "DSA Fighter", "symbol": "⚔️"},
-    {"xp": 1000, "name": "Algorithm Knight", "symbol": "🛡️"},
-    {"xp": 2000, "name": "Code Master", "symbol": "👑"}
-]
+# Pages and game.js kept in memory, precompressed; game.js is linked by a
+# content-hashed URL so browsers can cache it forever
+ASSETS = AssetBundle('.', pages=["index.html", "immersive.html"], scripts=["game.js"])
 
 # =====================
 # DEFAULT PLAYER STATE
@@ -542,90 +127,347 @@ DEFAULT_PLAYER = {
     "solved": [],
     "solved_mcq": [],
     "accuracy": 1.0,
-    "mastery": {"training_camp": 0, "array_forest": 0, "recursion_cave": 0, "dp_castle": 0}
+    "mastery": {"training_camp": 0, "array_forest": 0, "recursion_cave": 0, "dp_castle": 0},
+    "zone_xp": {"training_camp": 0, "array_forest": 0, "recursion_cave": 0, "dp_castle": 0}
 }
 
 # =====================
 # HELPER FUNCTIONS
 # =====================
-def load_player():
-    """Load player data from file or return default"""
-    if os.path.exists(SAVE_FILE):
-        try:
-            with open(SAVE_FILE, 'r') as f:
-                player = json.load(f)
-                # Ensure all keys exist
-                for key in DEFAULT_PLAYER:
-                    if key not in player:
-                        player[key] = DEFAULT_PLAYER[key]
-                return player
-        except:
-            pass
-    return copy.deepcopy(DEFAULT_PLAYER)
-
-def save_player(player):
-    """Save player data to file"""
-    with open(SAVE_FILE, 'w') as f:
-        json.dump(player, f, indent=2)
-
-def get_rank(total_xp):
-    """Get rank based on total XP (intelligence + coding_power)"""
-    for rank in reversed(RANKS):
-        if total_xp >= rank["xp"]:
-            return rank
-    return RANKS[0]
-
-def run_python_code(code, tests):
-    """Execute Python code and run tests"""
-    env = {}
+# Many players keyed by ID (SQLite, WAL). Active players are held in an LRU
+# cache and written behind in batches; whatever is still dirty is flushed
+# when the process exits. Every change is also an fsync'd event in EVENTS,
+# so progress lost in a crash is replayed from the log at startup.
+_store = PlayerStore(DB_FILE, DEFAULT_PLAYER)
+EVENTS = EventLog(EVENT_DIR, floor=_store.max_event_seq()) if EVENT_DIR else None
+PLAYERS = WriteBehindStore(_store, log=EVENTS)
+PLAYERS.import_json(SAVE_FILE, DEFAULT_PLAYER_ID)
+PLAYERS.recover()
+atexit.register(PLAYERS.close)
+
+# Rankings built once from the store, then updated on every XP change
+LEADERBOARD = Leaderboard()
+LEADERBOARD.load(PLAYERS.scores(), PLAYERS.zone_scores())
+
+# Adaptive /next picks: skill and item difficulty estimates plus a review schedule
+RECOMMENDER = Recommender()
+
+def bearer_token(authorization):
+    """Token from an "Authorization: Bearer <token>" header, else an empty string"""
+    scheme, _, token = authorization.partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else ""
+
+def resolve_player(token, player_header):
+    """Player ID for a request's credentials, or None if they are not accepted
+
+    A session token always decides. Without one, the local player is used
+    (or the X-Player-Id header's, with PLAYER_HEADER) unless REQUIRE_SESSION
+    is set.
+    """
+    if token:
+        return PLAYERS.session_player(token)
+    if REQUIRE_SESSION:
+        return None
+    return PLAYER_HEADER and player_header.strip() or DEFAULT_PLAYER_ID
+
+def current_player_id():
+    """Player ID for this request; aborts with 401 on a missing or unknown session"""
+    if "player_id" not in g:
+        player_id = resolve_player(bearer_token(request.headers.get("Authorization", "")),
+                                   request.headers.get("X-Player-Id", ""))
+        if player_id is None:
+            response = jsonify({"error": "Valid session token required"})
+            response.status_code = 401
+            response.headers["WWW-Authenticate"] = "Bearer"
+            abort(response)
+        g.player_id = player_id
+    return g.player_id
+
+@METRICS.timed("load_player")
+def load_player(player_id=None):
+    """Load player data from the store or return default"""
+    return PLAYERS.get(player_id or current_player_id())
+
+def view_player(player_id=None):
+    """The player's cached state without a copy, for read-only routes"""
+    return PLAYERS.view(player_id or current_player_id())
+
+@METRICS.timed("save_player")
+def save_player(player, player_id=None, reason="overwrite"):
+    """Replace a player's data wholesale (logged as a player_replaced event)"""
+    player_id = player_id or current_player_id()
+    with player_transaction(player_id) as current:
+        record_event(player_id, current, {"type": "player_replaced", "reason": reason, "player": player})
+        LEADERBOARD.update(player_id, current)
+
+@contextmanager
+def player_transaction(player_id):
+    """PLAYERS.transaction(), timed as a stage"""
+    with METRICS.stage("player_transaction"), PLAYERS.transaction(player_id) as player:
+        yield player
+
+def record_event(player_id, player, event):
+    """Apply a progress event to a player in an open transaction and log it"""
+    apply_event(player, event)
+    PLAYERS.record(player_id, event)
+
+def solved_sets(player):
+    """(solved code ids, solved MCQ ids) as sets for O(1) membership checks,
+    kept alongside the lists in the cached state (read-only)"""
+    return player.solved_ids["solved"], player.solved_ids["solved_mcq"]
+
+def get_rank(total_xp, catalog=None):
+    """Get rank based on total XP (intelligence + coding_power); `catalog`: the
+    content version a request started with (default: the current one)"""
+    return (catalog or CONTENT.catalog).progression.rank(total_xp)
+
+# Grading is written once, as generators of steps: they yield the blocking
+# work they need, ("io", fn, *args) for content files or ("judge", code,
+# suite, on_test) for a worker run, and are sent its result. run_steps() does
+# that work inline; asgi.py awaits it on thread pools instead.
+def run_steps(steps):
+    """Drive grading steps to completion on this thread; returns their result"""
     try:
-        exec(code, {"__builtins__": {}}, env)
-        if "solve" not in env:
-            return {"accuracy": 0, "error": "Function solve() not found"}
-        
-        passed = 0
-        for test in tests:
-            try:
-                input_copy = copy.deepcopy(test["input"])
-                if input_copy is None:
-                    result = env["solve"]()
-                else:
-                    result = env["solve"](input_copy)
-                if result == test["expected"]:
-                    passed += 1
-            except Exception as e:
-                pass
-        
-        accuracy = passed / len(tests)
-        return {"accuracy": accuracy, "error": None}
-    
-    except Exception as e:
-        return {"accuracy": 0, "error": str(e)}
-
-def explain_failure(problem, accuracy, error):
-    """Generate RAG explanation for failure"""
+        request = next(steps)
+        while True:
+            if request[0] == "judge":
+                value = JUDGE.run(*request[1:])
+            else:
+                value = request[1](*request[2:])
+            request = steps.send(value)
+    except StopIteration as done:
+        return done.value
+    finally:
+        steps.close()
+
+def run_python_code_steps(code, suite, problem_id=None, on_test=None):
+    """Execute Python code against a packed test suite in a judge worker process
+
+    Code the pre-judge rejects never reaches a worker. Results are cached by
+    (problem, suite hash, normalized code), so pressing Submit again with the
+    same code skips the worker round-trip.
+    """
+    with METRICS.stage("run_python_code"):
+        result = judge.prejudge(code, suite)
+        if result is None:
+            key = RESULTS.key(problem_id, suite, code)
+            result = RESULTS.get(key)
+            if result is None:
+                with METRICS.stage("judge_run"):
+                    result = yield ("judge", code, suite, on_test)
+                RESULTS.put(key, result)
+    JUDGE_OUTCOMES.inc(outcome=judge_outcome(result))
+    return result
+
+def judge_performance_steps(code, problem):
+    """Complexity check for problems with a content/perf spec (None if the problem has none)"""
+    with METRICS.stage("judge_performance"):
+        spec = yield ("io", CONTENT.performance, problem)
+        if spec is None:
+            return None
+        target, budget_ops, suite = spec
+        key = RESULTS.key(problem["id"], suite, code)
+        result = RESULTS.get(key)
+        if result is None:
+            result = yield ("judge", code, suite, None)
+            RESULTS.put(key, result)
+    return judge.check_performance(target, budget_ops, suite.sizes, result)
+
+def judge_outcome(result):
+    """Metrics label for one judged submission"""
+    if result.get("verdict"):
+        return result["verdict"]
+    if result["accuracy"] >= 1.0:
+        return "passed"
+    return "partial" if result["accuracy"] > 0 else "failed"
+
+HINT_MIN_TERMS = 2  # distinct failure features a retrieved hint must match
+GROWTH_FEATURES = {"O(n^2)": "quadratic", "O(n^3)": "cubic", "O(2^n) or worse": "exponential"}
+
+def failure_features(problem, result, code=""):
+    """Hint-index query for a failed submission: its verdict and exception type,
+    how the first failing test failed and the shape of its input, and code
+    patterns (structured tokens only, never the error text)"""
+    features = {hints.slug(result[key]) for key in ("verdict", "error_type") if result.get(key)}
+    outcomes = result.get("outcomes") or ()
+    failing = next((i for i, o in enumerate(outcomes) if o != judge.TEST_PASSED), None)
+    if failing is None and result.get("verdict") and "outcomes" in result:
+        failing = len(outcomes)  # the test running when the verdict hit
+    if failing is not None:
+        if failing < len(outcomes):
+            features.add(hints.slug(outcomes[failing]))
+        suite = CONTENT.test_suite(problem)
+        if failing < len(suite.tests):
+            features.update(hints.input_features(judge.test_input(suite, failing)))
+    if 0 < result["accuracy"] < 1:
+        features.add("partial")
+    return sorted(features | judge.analyze(code).features)
+
+def performance_features(performance, code=""):
+    """Hint-index query for a missed performance check: why it failed, the
+    measured growth class and code patterns"""
+    features = {"performance", performance["cause"]}
+    if performance.get("verdict"):
+        features.add(hints.slug(performance["verdict"]))
+    estimated = performance.get("estimated") or ""
+    if estimated in GROWTH_FEATURES:
+        features.add(GROWTH_FEATURES[estimated])
+    elif estimated.startswith("O(n^"):
+        features.add("polynomial")  # between the labelled classes, e.g. O(n^3.6)
+    return sorted(features | judge.analyze(code).features)
+
+def retrieve_hints(features, kb_key):
+    """The KB entry for kb_key, followed by the hints.json entries that best
+    match a failure's features (kb_key itself only helps rank them)"""
+    catalog = CONTENT.catalog
+    kb = catalog.kb
+    text = kb.get(kb_key, kb["general_logic"])
+    if catalog.hints is None:
+        return text
+    found = catalog.hints.search([*features, kb_key], min_terms=HINT_MIN_TERMS)
+    return "\n\n".join([text, *(catalog.hints.text(hint_id) for hint_id, _ in found)])
+
+@METRICS.timed("explain_failure")
+def explain_failure(problem, accuracy, error, verdict=None, hint=None, features=()):
+    """Generate RAG explanation for failure: hints retrieved for failure_features()
+    (`hint`: KB key the pre-judge picked)"""
+    kb_key = problem.get("kb_key", "general_logic")
+    if verdict == judge.REJECTED:
+        return f"Rejected before running:\n{error}\n\n" + retrieve_hints(features, hint or kb_key)
+    
+    if verdict == judge.TLE:
+        return (
+            f"Time Limit Exceeded:\n{error}\n\n"
+            "Check that every loop terminates and every recursion reaches its base case.\n\n"
+            + retrieve_hints(features, kb_key)
+        )
+    
+    if verdict:
+        return f"{verdict}:\n{error}\n\n" + retrieve_hints(features, "general_logic")
+    
     if error:
-        return f"Runtime Error Detected:\n{error}\n\n{KB['general_logic']}"
+        return f"Runtime Error Detected:\n{error}\n\n" + retrieve_hints(features, "general_logic")
     
     if accuracy == 0:
-        return KB.get(problem.get("kb_key", "general_logic"), KB["general_logic"])
+        return retrieve_hints(features, kb_key)
     
     return (
         "Partial correctness detected.\n"
         "Likely missing edge cases.\n\n"
-        + KB.get(problem.get("kb_key", "general_logic"), KB["general_logic"])
+        + retrieve_hints(features, kb_key)
     )
 
+def explain_performance(problem, performance, code=""):
+    """Hint for correct code that missed its complexity target (None otherwise)"""
+    if not performance or performance["passed"]:
+        return None
+    return (
+        f"Correct on the tests, but the performance check failed:\n{performance['reason']}.\n"
+        f"Half XP awarded — aim for {performance['target']}.\n\n"
+        + retrieve_hints(performance_features(performance, code), problem.get("kb_key", "general_logic"))
+    )
+
+def etag_for(*parts):
+    """Short hash of everything a player-specific response depends on"""
+    return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+
+def conditional_json(etag, build):
+    """JSON response with an ETag; a client that already has it gets a 304 and
+    build() (serialization) is skipped entirely"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(build() + "\n", mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"  # per player; revalidate every time
+    response.vary.add("Authorization")
+    response.vary.add("X-Player-Id")
+    return response
+
 # =====================
 # API ROUTES - STATIC FILES
 # =====================
+def serve_asset(asset):
+    """In-memory asset response: 304 on a matching ETag, else the smallest
+    precompressed variant the client accepts"""
+    if request.if_none_match.contains_weak(asset.etag):
+        response = Response(status=304)
+    else:
+        body, encoding = asset.select(lambda name: request.accept_encodings[name])
+        response = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(asset.etag, weak=True)  # weak: one tag covers every encoding
+    response.headers["Cache-Control"] = asset.cache_control
+    response.vary.add("Accept-Encoding")
+    return response
+
+def serve_page(name):
+    if app.debug:
+        ASSETS.refresh()  # pick up edits without a restart while developing
+    return serve_asset(ASSETS.page(name))
+
+@app.route('/game.js')
+def serve_script():
+    """Old links to game.js: redirect to the current hashed URL"""
+    if app.debug:
+        ASSETS.refresh()
+    return redirect(ASSETS.urls["game.js"])
+
 @app.route('/')
 def serve_immersive():
-    return send_from_directory('.', 'immersive.html')
+    return serve_page('immersive.html')
 
 @app.route('/game')
 def serve_game():
-    return send_from_directory('.', 'index.html')
+    return serve_page('index.html')
+
+@app.route('/assets/<path:filename>')
+def serve_hashed_asset(filename):
+    asset = ASSETS.asset('/assets/' + filename)
+    if asset is None:
+        abort(404)
+    return serve_asset(asset)
+
+# =====================
+# API ROUTES - SESSIONS
+# =====================
+@app.route('/api/session', methods=['POST'])
+def create_session():
+    """Issue a session token
+
+    A caller with a token (or, with PLAYER_HEADER, an X-Player-Id) gets one
+    for the same player. Otherwise the session starts a new player, except
+    that the first such session ever adopts the local player, so single-player
+    progress carries over once. With REQUIRE_SESSION every session is new.
+    """
+    data = request.get_json(silent=True) or {}
+    identified = bearer_token(request.headers.get("Authorization", "")) \
+        or PLAYER_HEADER and request.headers.get("X-Player-Id", "").strip()
+    if REQUIRE_SESSION:
+        player_id = "p_" + secrets.token_hex(8)
+    elif identified:
+        player_id = current_player_id()
+    elif PLAYERS.adopt(DEFAULT_PLAYER_ID):
+        player_id = DEFAULT_PLAYER_ID
+    else:
+        player_id = "p_" + secrets.token_hex(8)
+    name = str(data.get("name", "")).strip()
+    with player_transaction(player_id) as player:
+        if name:
+            record_event(player_id, player, {"type": "name_set", "name": name})
+        LEADERBOARD.update(player_id, player)
+    token = PLAYERS.create_session(player_id)
+    return jsonify({"token": token, "player_id": player_id}), 201
+
+@app.route('/api/session', methods=['DELETE'])
+def end_session():
+    """Revoke the caller's session token"""
+    token = bearer_token(request.headers.get("Authorization", ""))
+    if not token or PLAYERS.session_player(token) is None:
+        return jsonify({"error": "No session"}), 404
+    PLAYERS.end_session(token)
+    return jsonify({"success": True})
 
 # =====================
 # API ROUTES - PLAYER
@@ -634,27 +476,70 @@ def serve_game():
 def get_player():
     """Get player data"""
     player = load_player()
+    progression = CONTENT.catalog.progression
     total_xp = player["intelligence"] + player["coding_power"]
-    rank = get_rank(total_xp)
+    rank = progression.rank(total_xp)
     player["rank"] = rank["name"]
     player["rank_symbol"] = rank["symbol"]
     player["total_xp"] = total_xp
     
-    # Calculate next rank
-    next_rank = None
-    for r in RANKS:
-        if r["xp"] > total_xp:
-            next_rank = r
-            break
+    next_rank = progression.next_rank(total_xp)
     player["next_rank_xp"] = next_rank["xp"] if next_rank else None
     
     return jsonify(player)
 
+def _is_number(value, kinds=(int, float)):
+    return isinstance(value, kinds) and not isinstance(value, bool)
+
+def _valid_field(value, default):
+    """Whether a POSTed field has the default's shape: solved lists hold IDs
+    (str), zone maps go from zone (str) to an int"""
+    if isinstance(default, list):
+        return isinstance(value, list) and all(isinstance(item, str) for item in value)
+    if isinstance(default, dict):
+        return isinstance(value, dict) and all(
+            isinstance(zone, str) and _is_number(v, int) for zone, v in value.items())
+    if isinstance(default, (int, float)):
+        return _is_number(value)
+    return isinstance(value, type(default))
+
+def player_from_json(data):
+    """A full player state from a POSTed body, merged over DEFAULT_PLAYER;
+    None unless it is an object whose known fields have the default's shape"""
+    if not isinstance(data, dict):
+        return None
+    if not all(_valid_field(data[key], default) for key, default in DEFAULT_PLAYER.items() if key in data):
+        return None
+    player = copy.deepcopy(DEFAULT_PLAYER)
+    player.update(copy.deepcopy(data))
+    return player
+
+def set_name(name):
+    """Record a name_set event for the current player"""
+    player_id = current_player_id()
+    with player_transaction(player_id) as player:
+        record_event(player_id, player, {"type": "name_set", "name": name})
+        LEADERBOARD.update(player_id, player)
+
 @app.route('/api/player', methods=['POST'])
 def update_player():
-    """Update player data"""
-    player = request.json
+    """Update player data: {"name"} for anyone; progress only changes through
+    play, so any other field is a full overwrite (missing fields take their
+    defaults) that needs the admin token"""
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and data and set(data) <= {"name"}:
+        name = data["name"].strip() if isinstance(data["name"], str) else ""
+        if not name:
+            return jsonify({"error": "Name cannot be empty"}), 400
+        set_name(name)
+        return jsonify({"success": True})
+
+    require_admin()
+    player = player_from_json(data)
+    if player is None:
+        return jsonify({"error": "Expected a player object with fields of the default types"}), 400
     save_player(player)
+    RECOMMENDER.forget(current_player_id())
     return jsonify({"success": True})
 
 @app.route('/api/player/name', methods=['POST'])
@@ -665,15 +550,14 @@ def set_player_name():
     if not name:
         return jsonify({"error": "Name cannot be empty"}), 400
     
-    player = load_player()
-    player["name"] = name
-    save_player(player)
+    set_name(name)
     return jsonify({"success": True, "name": name})
 
 @app.route('/api/player/reset', methods=['POST'])
 def reset_player():
     """Reset player to default state"""
-    save_player(copy.deepcopy(DEFAULT_PLAYER))
+    save_player(copy.deepcopy(DEFAULT_PLAYER), reason="reset")
+    RECOMMENDER.forget(current_player_id())
     return jsonify({"success": True, "player": DEFAULT_PLAYER})
 
 # =====================
@@ -682,27 +566,38 @@ def reset_player():
 @app.route('/api/zones', methods=['GET'])
 def get_zones():
     """Get all zones with unlock status"""
-    player = load_player()
-    zones_data = {}
-    
-    for zone_id, zone in ZONES.items():
-        mcqs = MCQS.get(zone_id, [])
-        problems = PROBLEMS.get(zone_id, [])
-        
-        solved_mcq_count = len([m for m in mcqs if m["id"] in player["solved_mcq"]])
-        solved_code_count = len([p for p in problems if p["id"] in player["solved"]])
-        
-        zones_data[zone_id] = {
-            **zone,
-            "unlocked": player["intelligence"] >= zone["unlock_intelligence"],
-            "total_mcq": len(mcqs),
-            "solved_mcq": solved_mcq_count,
-            "total_problems": len(problems),
-            "solved_count": solved_code_count,
-            "mastery": player["mastery"].get(zone_id, 0)
-        }
-    
-    return jsonify(zones_data)
+    catalog = CONTENT.catalog
+    player = view_player()
+    solved, solved_mcq = solved_sets(player)
+    unlocked = catalog.progression.unlocked_zones(player["intelligence"])
+    
+    # Player overlay per zone: (unlocked, solved MCQs, solved problems, mastery)
+    overlay = {
+        zone_id: (
+            zone_id in unlocked,
+            catalog.count_solved(catalog.zone_mcq_set.get(zone_id, frozenset()), solved_mcq),
+            catalog.count_solved(catalog.zone_problem_set.get(zone_id, frozenset()), solved),
+            player["mastery"].get(zone_id, 0)
+        )
+        for zone_id in catalog.zones
+    }
+    
+    def build():
+        zones_data = {}
+        for zone_id, zone in catalog.zones.items():
+            unlocked, mcqs_solved, problems_solved, mastery = overlay[zone_id]
+            zones_data[zone_id] = {
+                **zone,
+                "unlocked": unlocked,
+                "total_mcq": len(catalog.zone_mcq_ids.get(zone_id, ())),
+                "solved_mcq": mcqs_solved,
+                "total_problems": len(catalog.zone_problem_ids.get(zone_id, ())),
+                "solved_count": problems_solved,
+                "mastery": mastery
+            }
+        return to_json(zones_data)
+    
+    return conditional_json(etag_for(catalog.digest, "zones", sorted(overlay.items())), build)
 
 # =====================
 # API ROUTES - MCQ
@@ -710,63 +605,62 @@ def get_zones():
 @app.route('/api/mcq/<zone>', methods=['GET'])
 def get_mcqs(zone):
     """Get all MCQs for a zone"""
-    if zone not in MCQS:
+    catalog = CONTENT.catalog
+    if zone not in catalog.zone_mcq_ids:
         return jsonify({"error": "Zone not found"}), 404
     
-    player = load_player()
-    mcqs = []
-    
-    for m in MCQS[zone]:
-        mcqs.append({
-            **m,
-            "solved": m["id"] in player["solved_mcq"],
-            "answer": None  # Hide answer from client
-        })
+    _, solved_mcq = solved_sets(view_player())
+    ids = catalog.zone_mcq_ids[zone]
+    flags = [i in solved_mcq for i in ids]
     
-    return jsonify(mcqs)
+    # Answers are already stripped from the pre-serialized entries
+    build = lambda: "[" + ",".join(catalog.mcq_json[i][flag] for i, flag in zip(ids, flags)) + "]"
+    return conditional_json(etag_for(catalog.digest, "mcq", zone, flags), build)
 
 @app.route('/api/mcq/<zone>/next', methods=['GET'])
 def get_next_mcq(zone):
-    """Get next unsolved MCQ in zone"""
-    if zone not in MCQS:
+    """Get the recommended next MCQ in zone (unsolved, or due for review)"""
+    catalog = CONTENT.catalog
+    if zone not in catalog.zone_mcq_ids:
         return jsonify({"error": "Zone not found"}), 404
     
-    player = load_player()
+    _, solved_mcq = solved_sets(view_player())
     
-    for mcq in MCQS[zone]:
-        if mcq["id"] not in player["solved_mcq"]:
-            return jsonify({
-                **mcq,
-                "answer": None  # Hide answer from client
-            })
+    pick = RECOMMENDER.recommend(catalog, current_player_id(), "mcq", zone, solved_mcq)
+    if pick:
+        mcq_id, why = pick
+        return jsonify({
+            **catalog.mcqs[mcq_id],
+            "answer": None,  # Hide answer from client
+            "intelligence_xp": catalog.progression.mcq_xp[mcq_id],
+            "recommendation": why
+        })
     
     return jsonify({"message": "All MCQs cleared!", "cleared": True})
 
 @app.route('/api/mcq/submit', methods=['POST'])
 def submit_mcq():
     """Submit MCQ answer"""
+    catalog = CONTENT.catalog
     data = request.json
     mcq_id = data.get("mcq_id", "")
     selected = data.get("selected", -1)  # Index of selected option
     zone = data.get("zone", "")
     
     # Find the MCQ
-    mcq = None
-    for z, mcqs in MCQS.items():
-        for m in mcqs:
-            if m["id"] == mcq_id:
-                mcq = m
-                break
-        if mcq:
-            break
+    mcq = catalog.mcqs.get(mcq_id)
     
     if not mcq:
         return jsonify({"error": "MCQ not found"}), 404
     
     # Check answer
     correct = selected == mcq["answer"]
+    player_id = current_player_id()
+    RECOMMENDER.observe(catalog, player_id, "mcq", mcq_id, 1 if correct else 0)
     
     if not correct:
+        with player_transaction(player_id) as player:
+            record_event(player_id, player, {"type": "mcq_answered", "mcq_id": mcq_id, "zone": zone, "correct": False})
         return jsonify({
             "success": False,
             "correct": False,
@@ -775,17 +669,14 @@ def submit_mcq():
         })
     
     # Award intelligence XP
-    player = load_player()
-    xp = mcq["intelligence_xp"]
-    player["intelligence"] += xp
-    
-    if mcq_id not in player["solved_mcq"]:
-        player["solved_mcq"].append(mcq_id)
-    
-    player["mastery"][zone] = min(100, player["mastery"].get(zone, 0) + 10)
-    player["rank"] = get_rank(player["intelligence"] + player["coding_power"])["name"]
-    
-    save_player(player)
+    xp = catalog.progression.mcq_xp[mcq_id]
+    with player_transaction(player_id) as player:
+        record_event(player_id, player, {
+            "type": "mcq_answered", "mcq_id": mcq_id, "zone": zone, "correct": True,
+            "home_zone": catalog.mcq_zone[mcq_id], "xp": xp, "mastery_gain": 10,
+            "rank": get_rank(player["intelligence"] + player["coding_power"] + xp, catalog)["name"]
+        })
+        LEADERBOARD.update(player_id, player)  # inside the write lock, so updates apply in order
     
     return jsonify({
         "success": True,
@@ -802,112 +693,342 @@ def submit_mcq():
 @app.route('/api/problems/<zone>', methods=['GET'])
 def get_problems(zone):
     """Get all code problems for a zone"""
-    if zone not in PROBLEMS:
+    catalog = CONTENT.catalog
+    if zone not in catalog.zone_problem_ids:
         return jsonify({"error": "Zone not found"}), 404
     
-    player = load_player()
-    problems = []
+    solved, _ = solved_sets(view_player())
+    ids = catalog.zone_problem_ids[zone]
+    flags = [i in solved for i in ids]
     
-    for p in PROBLEMS[zone]:
-        problems.append({
-            **p,
-            "solved": p["id"] in player["solved"],
-            "potential_xp": int(p["base_xp"] * DIFF_MULTI[p["difficulty"]])
-        })
-    
-    return jsonify(problems)
+    build = lambda: "[" + ",".join(catalog.problem_json[i][flag] for i, flag in zip(ids, flags)) + "]"
+    return conditional_json(etag_for(catalog.digest, "problems", zone, flags), build)
 
 @app.route('/api/problems/<zone>/next', methods=['GET'])
 def get_next_problem(zone):
-    """Get next unsolved problem in zone"""
-    if zone not in PROBLEMS:
+    """Get the recommended next problem in zone (unsolved, or due for review)"""
+    catalog = CONTENT.catalog
+    if zone not in catalog.zone_problem_ids:
         return jsonify({"error": "Zone not found"}), 404
     
-    player = load_player()
+    solved, _ = solved_sets(view_player())
     
-    for problem in PROBLEMS[zone]:
-        if problem["id"] not in player["solved"]:
-            return jsonify({
-                **problem,
-                "potential_xp": int(problem["base_xp"] * DIFF_MULTI[problem["difficulty"]])
-            })
+    pick = RECOMMENDER.recommend(catalog, current_player_id(), "problem", zone, solved)
+    if pick:
+        problem_id, why = pick
+        return jsonify({
+            **catalog.problems[problem_id],
+            "potential_xp": catalog.potential_xp[problem_id],
+            "recommendation": why
+        })
     
     return jsonify({"message": "Zone cleared!", "cleared": True})
 
-@app.route('/api/submit', methods=['POST'])
-def submit_code():
-    """Submit code for evaluation"""
-    data = request.json
+def judge_submission(player_id, data, on_test=None):
+    """Judge a submission and award XP; returns (payload, status code)"""
+    catalog = CONTENT.catalog
     code = data.get("code", "")
     problem_id = data.get("problem_id", "")
     zone = data.get("zone", "")
     
     # Find the problem
-    problem = None
-    for z, problems in PROBLEMS.items():
-        for p in problems:
-            if p["id"] == problem_id:
-                problem = p
-                break
-        if problem:
-            break
+    problem = catalog.problems.get(problem_id)
     
     if not problem:
-        return jsonify({"error": "Problem not found"}), 404
+        return {"error": "Problem not found"}, 404
     
-    # Run the code
-    result = run_python_code(code, problem["tests"])
+    result, performance = grade(code, problem, on_test)
+    return score_submission(player_id, catalog, problem, zone, result, performance, code)
+
+def grade_steps(code, problem, on_test=None):
+    """(correctness result, performance check or None) for one submission;
+    correct code is also timed on larger inputs"""
+    suite = yield ("io", CONTENT.test_suite, problem)  # hidden tests may be read from disk
+    result = yield from run_python_code_steps(code, suite, problem["id"], on_test)
+    performance = (yield from judge_performance_steps(code, problem)) if passes(result) else None
+    return result, performance
+
+def grade(code, problem, on_test=None):
+    return run_steps(grade_steps(code, problem, on_test))
+
+def passes(result):
+    """Whether a correctness result earns XP"""
+    return not result.get("verdict") and result["accuracy"] >= 0.5
+
+# Scoring takes the catalog the request started with: judging can take seconds,
+# and a content reload meanwhile must not mix two versions' XP tables.
+def submission_xp(catalog, problem, accuracy, performance=None):
+    """XP for a passing submission"""
+    xp = catalog.progression.submission_xp(problem["id"], accuracy)
+    if performance and not performance["passed"]:
+        xp = int(xp * PERF_MISS_XP)
+    return xp
+
+def award_xp(player_id, player, catalog, problem, zone, accuracy, performance=None):
+    """Apply a passing submission to a player in an open transaction; returns the XP earned"""
+    problem_id = problem["id"]
+    xp = submission_xp(catalog, problem, accuracy, performance)
+    record_event(player_id, player, {
+        "type": "code_judged", "problem_id": problem_id, "zone": zone, "accuracy": accuracy, "passed": True,
+        "home_zone": catalog.problem_zone[problem_id], "xp": xp, "mastery_gain": int(accuracy * 25),
+        "rank": get_rank(player["intelligence"] + player["coding_power"] + xp, catalog)["name"]
+    })
+    return xp
+
+def score_submission(player_id, catalog, problem, zone, result, performance=None, code=""):
+    """Turn judge results into the /api/submit payload, awarding XP on success"""
     accuracy = result["accuracy"]
     error = result["error"]
+    verdict = result.get("verdict")
+    RECOMMENDER.observe(catalog, player_id, "problem", problem["id"], 0 if verdict else accuracy)
+    if verdict != judge.BUSY:  # never reached the judge
+        STATS.record(problem["id"], result.get("error_type") or judge_outcome(result), passes(result), result)
     
-    if accuracy < 0.5:
-        explanation = explain_failure(problem, accuracy, error)
-        return jsonify({
+    if not passes(result):
+        with player_transaction(player_id) as player:
+            record_event(player_id, player, {
+                "type": "code_judged", "problem_id": problem["id"], "zone": zone, "accuracy": accuracy,
+                "passed": False, "verdict": verdict
+            })
+        explanation = explain_failure(problem, accuracy, error, verdict, result.get("hint"),
+                                      failure_features(problem, result, code))
+        return {
             "success": False,
             "accuracy": accuracy,
+            "verdict": verdict,
+            "timings_ms": result.get("timings_ms"),
+            "ops": result.get("ops"),
             "explanation": explanation
-        })
-    
-    # Calculate XP
-    xp = int(problem["base_xp"] * DIFF_MULTI[problem["difficulty"]] * accuracy)
+        }, 200
     
     # Update player
-    player = load_player()
-    player["coding_power"] += xp
-    player["accuracy"] = (player["accuracy"] + accuracy) / 2
-    
-    if problem_id not in player["solved"]:
-        player["solved"].append(problem_id)
+    with player_transaction(player_id) as player:
+        xp = award_xp(player_id, player, catalog, problem, zone, accuracy, performance)
+        LEADERBOARD.update(player_id, player)  # inside the write lock, so updates apply in order
     
-    player["mastery"][zone] = min(100, player["mastery"].get(zone, 0) + int(accuracy * 25))
-    player["rank"] = get_rank(player["intelligence"] + player["coding_power"])["name"]
-    
-    save_player(player)
-    
-    return jsonify({
+    return {
         "success": True,
         "accuracy": accuracy,
+        "timings_ms": result.get("timings_ms"),
+        "ops": result.get("ops"),
         "xp_earned": xp,
         "new_coding_power": player["coding_power"],
         "new_rank": player["rank"],
-        "mastery": player["mastery"][zone]
-    })
+        "mastery": player["mastery"][zone],
+        "performance": performance,
+        "explanation": explain_performance(problem, performance, code)
+    }, 200
+
+@app.route('/api/submit', methods=['POST'])
+def submit_code():
+    """Submit code for evaluation ("async": true queues it and returns a job ID)"""
+    data = request.json
+    player_id = current_player_id()
+    
+    if not data.get("async"):
+        payload, status = judge_submission(player_id, data)
+        return jsonify(payload), status
+    
+    payload, status = queue_submission(player_id, data)
+    response = jsonify(payload)
+    if status == 503:
+        response.headers["Retry-After"] = QUEUE_RETRY_AFTER
+    return response, status
+
+def queue_submission(player_id, data):
+    """Queue a submission on JOBS; returns (payload, status code)"""
+    if data.get("problem_id", "") not in CONTENT.catalog.problems:
+        return {"error": "Problem not found"}, 404
+    
+    def work(job):
+        def on_test(index, passed, ms):
+            job.emit("test", {"index": index, "passed": passed, "time_ms": ms})
+        payload, _ = judge_submission(player_id, data, on_test)
+        return payload
+    
+    job = JOBS.submit(work)
+    if job is None:
+        return {"error": "Judge queue is full, try again shortly", "queue_depth": JOBS.depth()}, 503
+    
+    return {"job_id": job.id, "status": job.status, "queue_depth": JOBS.depth()}, 202
+
+@app.route('/api/submit/<job_id>', methods=['GET'])
+def get_submission(job_id):
+    """Poll an async submission: status, per-test progress and final result"""
+    job = JOBS.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/api/submit/<job_id>/events', methods=['GET'])
+def stream_submission(job_id):
+    """Server-sent events for an async submission: status, test, done / failed"""
+    job = JOBS.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    def events():
+        sent = 0
+        while True:
+            batch = job.wait(sent, timeout=15)
+            if not batch:
+                yield ": keep-alive\n\n"
+            for event, data in batch:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            sent += len(batch)
+            if job.done and sent >= len(job.events):
+                return
+    
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# =====================
+# API ROUTES - BATCH GRADING
+# =====================
+def grade_record(index, record):
+    """Grade one batch record; returns (output row, award args for award_xp() or None)"""
+    catalog = CONTENT.catalog
+    problem_id = record.get("problem_id", "")
+    row = {"index": index, "player_id": record.get("player_id") or DEFAULT_PLAYER_ID, "problem_id": problem_id}
+    problem = catalog.problems.get(problem_id)
+    if not problem:
+        return {**row, "error": "Problem not found"}, None
+    
+    result, performance = grade(record.get("code", ""), problem)
+    success = passes(result)
+    row.update(
+        success=success,
+        accuracy=result["accuracy"],
+        verdict=result.get("verdict"),
+        error=result.get("error"),
+        ops=result.get("ops"),
+        performance=performance,
+        xp=submission_xp(catalog, problem, result["accuracy"], performance) if success else 0
+    )
+    if not success:
+        return row, None
+    zone = record.get("zone") or catalog.problem_zone[problem_id]
+    return row, (catalog, problem, zone, result["accuracy"], performance)
+
+def grade_batch(records, apply_xp=False):
+    """Grade {"player_id", "problem_id", "code", "zone"?} records across the judge pool
+
+    Yields one row per record as it finishes (tagged with its input "index").
+    With apply_xp, then yields one {"player_id", "xp_applied", ...} row per
+    player after applying all their passing submissions in one transaction.
+    """
+    awards = {}
+    pool = ThreadPoolExecutor(JUDGE.size, thread_name_prefix="eq-grade")
+    try:
+        futures = [pool.submit(grade_record, i, record) for i, record in enumerate(records)]
+        for future in as_completed(futures):
+            row, award = future.result()
+            yield row
+            if award:
+                awards.setdefault(row["player_id"], []).append((row["index"], award))
+    finally:
+        pool.shutdown(cancel_futures=True)
+    
+    if not apply_xp:
+        return
+    for player_id, items in awards.items():
+        items.sort(key=lambda item: item[0])  # input order, whatever order judging finished in
+        with player_transaction(player_id) as player:
+            xp = sum(award_xp(player_id, player, *award) for _, award in items)
+            LEADERBOARD.update(player_id, player)
+        yield {"player_id": player_id, "xp_applied": xp, "submissions": len(items), "new_rank": player["rank"]}
 
 # =====================
 # API ROUTES - LEADERBOARD
 # =====================
+def leaderboard_rows(rows, player_id):
+    """Serialize (position, player_id, xp) rows"""
+    return [{
+        "position": position,
+        "name": LEADERBOARD.names.get(pid) or "Anonymous",
+        "xp": xp,
+        "rank": get_rank(LEADERBOARD.overall.score(pid) or 0)["name"],
+        "you": pid == player_id
+    } for position, pid, xp in rows]
+
+def leaderboard_arg(name, default, upper):
+    return max(0, min(upper, request.args.get(name, default, type=int)))
+
 @app.route('/api/leaderboard', methods=['GET'])
-def get_leaderboard():
-    """Get leaderboard"""
-    player = load_player()
-    total_xp = player["intelligence"] + player["coding_power"]
-    return jsonify([
-        {"name": player["name"] or "You", "xp": total_xp, "rank": get_rank(total_xp)["name"]},
-        {"name": "CodeMaster42", "xp": 2500, "rank": "Code Master"},
-        {"name": "ByteNinja", "xp": 1800, "rank": "Algorithm Knight"},
-        {"name": "RecursiveRider", "xp": 950, "rank": "DSA Fighter"},
-        {"name": "ArrayAce", "xp": 450, "rank": "Coder"}
-    ])
+@app.route('/api/leaderboard/<zone>', methods=['GET'])
+def get_leaderboard(zone=None):
+    """Get top players overall or in a zone (?limit=N)"""
+    if zone is not None and zone not in CONTENT.catalog.zones:
+        return jsonify({"error": "Zone not found"}), 404
+    
+    rows = LEADERBOARD.top(leaderboard_arg("limit", 10, 100), zone)
+    return jsonify(leaderboard_rows(rows, current_player_id()))
+
+@app.route('/api/leaderboard/me', methods=['GET'])
+@app.route('/api/leaderboard/<zone>/me', methods=['GET'])
+def get_leaderboard_position(zone=None):
+    """Get the player's own position with neighbours (?radius=N)"""
+    if zone is not None and zone not in CONTENT.catalog.zones:
+        return jsonify({"error": "Zone not found"}), 404
+    
+    player_id = current_player_id()
+    position, total, rows = LEADERBOARD.around(player_id, leaderboard_arg("radius", 2, 25), zone)
+    return jsonify({
+        "position": position,
+        "total": total,
+        "neighbours": leaderboard_rows(rows, player_id)
+    })
+
+# =====================
+# API ROUTES - ADMIN
+# =====================
+def require_admin():
+    """Abort with 403 unless ADMIN_TOKEN is set and the request carries it"""
+    if not ADMIN_TOKEN:
+        response = jsonify({"error": "Admin routes are disabled (EQ_ADMIN_TOKEN is not set)"})
+        response.status_code = 403
+        abort(response)
+    if not secrets.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        response = jsonify({"error": "Admin token required"})
+        response.status_code = 403
+        abort(response)
+
+@app.route('/api/admin/grade', methods=['POST'])
+def grade_submissions():
+    """Batch-grade {"submissions": [...], "apply_xp": false}; streams JSON lines"""
+    require_admin()
+    data = request.json
+    records = data.get("submissions") if isinstance(data, dict) else None
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        return jsonify({"error": "Expected {\"submissions\": [{\"player_id\", \"problem_id\", \"code\"}, ...]}"}), 400
+    if len(records) > BATCH_MAX_RECORDS:
+        return jsonify({"error": f"At most {BATCH_MAX_RECORDS} submissions per batch"}), 413
+    
+    rows = grade_batch(records, bool(data.get("apply_xp")))
+    return Response(stream_with_context(json.dumps(row) + "\n" for row in rows), mimetype="application/x-ndjson")
+
+@app.route('/api/admin/stats', methods=['GET'])
+def admin_stats():
+    """Submission analytics: every problem (lowest pass rate first, with its
+    hardest tests), or ?problem=<id> with every test; ?window=<seconds> for
+    the rolling window instead of all time, ?hardest=<n> tests per problem"""
+    require_admin()
+    problem_id = request.args.get("problem") or None
+    window = request.args.get("window", type=float)
+    hardest = request.args.get("hardest", 5, type=int)
+    if "window" in request.args and (window is None or window <= 0):
+        return jsonify({"error": "window must be a positive number of seconds"}), 400
+    if problem_id is not None and problem_id not in CONTENT.catalog.problems:
+        return jsonify({"error": "Problem not found"}), 404
+    return jsonify(STATS.query(problem_id, window, max(hardest, 0)))
+
+# =====================
+# API ROUTES - METRICS
+# =====================
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition"""
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 # =====================
 # RUN SERVER
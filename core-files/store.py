@@ -0,0 +1,630 @@
+"""
+EngineerQuest RPG - Player Store
+SQLite (WAL mode) persistence for many players keyed by ID and their session
+tokens, with an optional write-behind layer that keeps active players in an
+in-memory LRU cache, logs their progress events and flushes changes in batches
+"""
+
+import copy
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from events import PlayerState, apply as apply_event
+
+FLUSH_INTERVAL = float(os.environ.get("EQ_FLUSH_INTERVAL", 1.0))  # seconds between write-behind flushes
+FLUSH_BATCH = int(os.environ.get("EQ_FLUSH_BATCH", 256))          # dirty players that trigger an early flush
+PLAYER_CACHE_SIZE = int(os.environ.get("EQ_PLAYER_CACHE_SIZE", 10000))  # players kept in memory
+LOCK_STRIPES = 64  # per-player transaction locks, shared by hash of the player ID
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id           TEXT PRIMARY KEY,
+    name         TEXT NOT NULL DEFAULT '',
+    intelligence INTEGER NOT NULL DEFAULT 0,
+    coding_power INTEGER NOT NULL DEFAULT 0,
+    rank         TEXT NOT NULL DEFAULT 'Trainee',
+    accuracy     REAL NOT NULL DEFAULT 1.0,
+    event_seq    INTEGER NOT NULL DEFAULT 0  -- last event-log entry this row includes
+);
+CREATE INDEX IF NOT EXISTS idx_players_name ON players (name);
+CREATE INDEX IF NOT EXISTS idx_players_total_xp ON players ((intelligence + coding_power));
+
+CREATE TABLE IF NOT EXISTS solved (
+    player_id TEXT NOT NULL,
+    kind      TEXT NOT NULL,  -- 'code' or 'mcq'
+    item_id   TEXT NOT NULL,
+    UNIQUE (player_id, kind, item_id)
+);
+
+CREATE TABLE IF NOT EXISTS mastery (
+    player_id TEXT NOT NULL,
+    zone      TEXT NOT NULL,
+    value     INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_id, zone)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS zone_xp (
+    player_id TEXT NOT NULL,
+    zone      TEXT NOT NULL,
+    value     INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (player_id, zone)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sessions (
+    token_hash TEXT PRIMARY KEY,  -- sha256 of the bearer token; the token itself is never stored
+    player_id  TEXT NOT NULL,
+    created    REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS adopted (
+    player_id TEXT PRIMARY KEY  -- shared players already handed to a session
+) WITHOUT ROWID;
+"""
+
+# Player dict key -> solved.kind
+SOLVED_KINDS = {"solved": "code", "solved_mcq": "mcq"}
+
+# Per-zone {zone: int} maps; player dict key == table name
+ZONE_MAPS = ("mastery", "zone_xp")
+
+def token_hash(token):
+    return hashlib.sha256(token.encode("utf-8", "surrogatepass")).hexdigest()
+
+class PlayerStore:
+    """Players keyed by ID; dicts in the same shape as DEFAULT_PLAYER"""
+
+    def __init__(self, path, defaults):
+        self.path = path
+        self.defaults = defaults
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if "event_seq" not in {row[1] for row in conn.execute("PRAGMA table_info(players)")}:
+            conn.execute("ALTER TABLE players ADD COLUMN event_seq INTEGER NOT NULL DEFAULT 0")
+
+    # ---------------------
+    # Connections
+    # ---------------------
+    def _conn(self):
+        """One connection per thread; transactions are managed explicitly"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """BEGIN IMMEDIATE takes the write lock up front, so concurrent
+        read-modify-write cycles serialize instead of losing updates"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # ---------------------
+    # Row <-> dict
+    # ---------------------
+    def _read(self, conn, player_id):
+        row = conn.execute(
+            "SELECT name, intelligence, coding_power, rank, accuracy FROM players WHERE id = ?",
+            (player_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        player = copy.deepcopy(self.defaults)
+        player["name"], player["intelligence"], player["coding_power"], player["rank"], player["accuracy"] = row
+        for key, kind in SOLVED_KINDS.items():
+            player[key] = [item for (item,) in conn.execute(
+                "SELECT item_id FROM solved WHERE player_id = ? AND kind = ? ORDER BY rowid",
+                (player_id, kind)
+            )]
+        for table in ZONE_MAPS:
+            for zone, value in conn.execute(
+                f"SELECT zone, value FROM {table} WHERE player_id = ?", (player_id,)
+            ):
+                player[table][zone] = value
+        return player
+
+    def _write_player(self, conn, player_id, player, before=None, event_seq=0):
+        """Persist player; with `before`, only what changed since it is written"""
+        conn.execute(
+            "INSERT INTO players (id, name, intelligence, coding_power, rank, accuracy, event_seq) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET name = excluded.name, intelligence = excluded.intelligence, "
+            "coding_power = excluded.coding_power, rank = excluded.rank, accuracy = excluded.accuracy, "
+            "event_seq = MAX(event_seq, excluded.event_seq)",
+            (player_id, player.get("name", ""), player.get("intelligence", 0),
+             player.get("coding_power", 0), player.get("rank", "Trainee"), player.get("accuracy", 1.0),
+             event_seq)
+        )
+
+        for key, kind in SOLVED_KINDS.items():
+            new = player.get(key, [])
+            if before is None:
+                conn.execute("DELETE FROM solved WHERE player_id = ? AND kind = ?", (player_id, kind))
+                old = set()
+            else:
+                old = set(before.get(key, []))
+                removed = old.difference(new)
+                conn.executemany(
+                    "DELETE FROM solved WHERE player_id = ? AND kind = ? AND item_id = ?",
+                    [(player_id, kind, item) for item in removed]
+                )
+            conn.executemany(
+                "INSERT OR IGNORE INTO solved (player_id, kind, item_id) VALUES (?, ?, ?)",
+                [(player_id, kind, item) for item in new if item not in old]
+            )
+
+        for table in ZONE_MAPS:
+            values = player.get(table, {})
+            if before is None:
+                conn.execute(f"DELETE FROM {table} WHERE player_id = ?", (player_id,))
+            else:
+                values = {z: v for z, v in values.items() if before.get(table, {}).get(z) != v}
+            conn.executemany(
+                f"INSERT INTO {table} (player_id, zone, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(player_id, zone) DO UPDATE SET value = excluded.value",
+                [(player_id, zone, value) for zone, value in values.items()]
+            )
+
+    # ---------------------
+    # Public API
+    # ---------------------
+    def exists(self, player_id):
+        return self._conn().execute(
+            "SELECT 1 FROM players WHERE id = ?", (player_id,)
+        ).fetchone() is not None
+
+    def get(self, player_id):
+        """Load a player, or a fresh default one if the ID is unknown"""
+        player = self._read(self._conn(), player_id)
+        return player if player is not None else copy.deepcopy(self.defaults)
+
+    def view(self, player_id):
+        """get() as a PlayerState (a fresh copy, like every read here)"""
+        return PlayerState(self.get(player_id))
+
+    def put(self, player_id, player):
+        """Overwrite a player wholesale"""
+        with self._write() as conn:
+            self._write_player(conn, player_id, player)
+
+    def put_many(self, items):
+        """Write [(player_id, player, before | None, event_seq), ...] in one transaction"""
+        with self._write() as conn:
+            for player_id, player, before, event_seq in items:
+                self._write_player(conn, player_id, player, before, event_seq)
+
+    def get_versioned(self, player_id):
+        """(player or None if unknown, seq of the last logged event it includes)"""
+        conn = self._conn()
+        player = self._read(conn, player_id)
+        if player is None:
+            return None, 0
+        row = conn.execute("SELECT event_seq FROM players WHERE id = ?", (player_id,)).fetchone()
+        return player, row[0] if row else 0
+
+    def max_event_seq(self):
+        return self._conn().execute("SELECT COALESCE(MAX(event_seq), 0) FROM players").fetchone()[0]
+
+    @contextmanager
+    def transaction(self, player_id):
+        """Atomic read-modify-write of one player:
+
+            with store.transaction(pid) as player:
+                player["intelligence"] += 10
+        """
+        with self._write() as conn:
+            before = self._read(conn, player_id)
+            player = copy.deepcopy(before) if before is not None else copy.deepcopy(self.defaults)
+            yield player
+            self._write_player(conn, player_id, player, before)
+
+    def scores(self):
+        """(player_id, name, total_xp) for every player, for building rankings"""
+        return self._conn().execute(
+            "SELECT id, name, intelligence + coding_power FROM players"
+        ).fetchall()
+
+    def zone_scores(self):
+        """(player_id, zone, xp) for every non-zero per-zone XP entry"""
+        return self._conn().execute(
+            "SELECT player_id, zone, value FROM zone_xp WHERE value > 0"
+        ).fetchall()
+
+    def import_json(self, path, player_id):
+        """One-time import of a legacy player_data.json save file"""
+        if not os.path.exists(path) or self.exists(player_id):
+            return False
+        try:
+            with open(path, 'r') as f:
+                player = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for key in self.defaults:
+            if key not in player:
+                player[key] = copy.deepcopy(self.defaults[key])
+        self.put(player_id, player)
+        return True
+
+    # ---------------------
+    # Sessions
+    # ---------------------
+    def create_session(self, player_id):
+        """New bearer token for a player"""
+        token = secrets.token_urlsafe(32)
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO sessions (token_hash, player_id, created) VALUES (?, ?, ?)",
+                (token_hash(token), player_id, time.time())
+            )
+        return token
+
+    def session_player(self, token):
+        """Player ID a token belongs to, or None"""
+        row = self._conn().execute(
+            "SELECT player_id FROM sessions WHERE token_hash = ?", (token_hash(token),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def end_session(self, token):
+        with self._write() as conn:
+            conn.execute("DELETE FROM sessions WHERE token_hash = ?", (token_hash(token),))
+
+    def adopt(self, player_id):
+        """Claim a player for a new session; True only the first time, ever"""
+        with self._write() as conn:
+            return conn.execute(
+                "INSERT OR IGNORE INTO adopted (player_id) VALUES (?)", (player_id,)
+            ).rowcount == 1
+
+class WriteBehindStore:
+    """PlayerStore front where active players live in memory and are authoritative
+
+    Players are kept in an LRU cache of `capacity` entries, so reads and
+    transactions for an active player never touch the database. Changes mark
+    a player dirty. A background thread writes all dirty players in one
+    transaction every `interval` seconds, or sooner once `batch` players are
+    dirty, and close() flushes the rest. A player changed many times between
+    flushes is written once, diffed against what was last persisted. Only
+    clean players are evicted. Only one process may use the database this way.
+
+    With an event log, events record()ed in a transaction are appended when
+    it commits, and the transaction returns once they are on disk. Each flushed
+    row carries the seq of its player's last event, so recover() replays only
+    what a crash kept out of the database. Log segments are compacted once the
+    database includes them. Without a log, a crash loses at most the last
+    interval of changes, and never leaves a torn record.
+    """
+
+    def __init__(self, store, log=None, interval=FLUSH_INTERVAL, batch=FLUSH_BATCH, capacity=PLAYER_CACHE_SIZE):
+        self.store = store
+        self.log = log
+        self.defaults = store.defaults
+        self.interval = interval
+        self.batch = batch
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._players = OrderedDict()  # player_id -> current PlayerState (replaced, never mutated in place)
+        self._persisted = {}  # player_id -> state as last written (None: not in the database)
+        self._dirty = set()
+        self._seqs = {}         # player_id -> seq of the last event applied to its current state
+        self._dirty_since = {}  # player_id -> seq of its first event not yet in the database
+        self._pending = {}      # player_id -> events record()ed in its open transaction
+        self._sessions = OrderedDict()  # token hash -> player_id
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="player-flush", daemon=True)
+        self._thread.start()
+
+    # ---------------------
+    # Memory
+    # ---------------------
+    def _player_lock(self, player_id):
+        return self._stripes[hash(player_id) % LOCK_STRIPES]
+
+    def _current(self, player_id):
+        """Cached state, loading it from the database on a miss (caller holds the player's lock)"""
+        with self._lock:
+            player = self._players.get(player_id)
+            if player is not None:
+                self._players.move_to_end(player_id)
+                self.hits += 1
+                return player
+            self.misses += 1
+
+        player, seq = self.store.get_versioned(player_id)
+        exists = player is not None
+        player = PlayerState(player if exists else copy.deepcopy(self.defaults))
+        with self._lock:
+            if player_id not in self._players:
+                self._players[player_id] = player
+                self._persisted[player_id] = player if exists else None
+                self._seqs[player_id] = seq
+            player = self._players[player_id]
+            self._evict()
+            return player
+
+    def _replace(self, player_id, player, events=(), before=None, replayed=None):
+        """Install a player's new state (caller holds the player's lock). `events`
+        are appended to the log, or `replayed` is the seq of a recovered event.
+        Returns the seq of the last event, if any."""
+        with self._lock:
+            seq = None
+            if events and self.log is not None:
+                if not self._seqs.get(player_id):
+                    events = [{"type": "player_replaced", "reason": "baseline", "player": before}, *events]
+                seq = self.log.append(player_id, events)
+                first = seq - len(events) + 1
+            elif replayed is not None:
+                seq = first = replayed
+            if seq is not None:
+                self._seqs[player_id] = seq
+                self._dirty_since.setdefault(player_id, first)
+            self._players[player_id] = player
+            self._players.move_to_end(player_id)
+            self._dirty.add(player_id)
+            dirty = len(self._dirty)
+        if dirty >= self.batch:
+            self._wake.set()
+        return seq
+
+    def _evict(self):
+        """Drop least recently used clean players beyond capacity, never the most
+        recent one (caller holds _lock)"""
+        excess = len(self._players) - self.capacity
+        if excess <= 0:
+            return
+        newest = next(reversed(self._players))
+        victims = []
+        for player_id in self._players:
+            if player_id not in self._dirty and player_id != newest:
+                victims.append(player_id)
+                if len(victims) == excess:
+                    break
+        for player_id in victims:
+            del self._players[player_id]
+            self._persisted.pop(player_id, None)
+            self._seqs.pop(player_id, None)
+        if len(victims) < excess:
+            self._wake.set()  # the rest become evictable once flushed
+
+    # ---------------------
+    # Public API (same as PlayerStore)
+    # ---------------------
+    def exists(self, player_id):
+        with self._lock:
+            if player_id in self._players:
+                return player_id in self._dirty or self._persisted.get(player_id) is not None
+        return self.store.exists(player_id)
+
+    def get(self, player_id):
+        # Under the player's lock, so a load from the database can't race a
+        # transaction that is about to be flushed and evicted
+        with self._player_lock(player_id):
+            player = self._current(player_id)
+        return copy.deepcopy(player)
+
+    def view(self, player_id):
+        """The current state itself, not a copy: states are replaced, never
+        changed in place, so it is safe to read but must not be modified"""
+        with self._player_lock(player_id):
+            return self._current(player_id)
+
+    def put(self, player_id, player):
+        with self._player_lock(player_id):
+            self._current(player_id)
+            self._replace(player_id, PlayerState(copy.deepcopy(player)))
+
+    @contextmanager
+    def transaction(self, player_id):
+        """Atomic read-modify-write of one player; an exception discards the changes
+        and any record()ed events"""
+        with self._player_lock(player_id):
+            before = self._current(player_id)
+            player = copy.deepcopy(before)
+            self._pending[player_id] = []
+            try:
+                yield player
+            finally:
+                events = self._pending.pop(player_id)
+            seq = self._replace(player_id, player, events, before)
+        if seq is not None:
+            self.log.wait(seq)  # group commit: durable before the caller answers
+
+    def record(self, player_id, event):
+        """Log an event with the player's open transaction; the caller applies it
+        to the yielded dict with events.apply()"""
+        pending = self._pending.get(player_id)
+        if pending is None:
+            raise RuntimeError(f"record() outside a transaction for player {player_id!r}")
+        pending.append(event)
+
+    def recover(self):
+        """Re-apply logged events the database doesn't include yet (after a crash,
+        at startup); returns how many were replayed"""
+        if self.log is None:
+            return 0
+        replayed = 0
+        for event in self.log.replay():
+            player_id = event["player_id"]
+            with self._player_lock(player_id):
+                before = self._current(player_id)
+                if event["seq"] <= self._seqs.get(player_id, 0):
+                    continue
+                player = copy.deepcopy(before)
+                try:
+                    apply_event(player, event)
+                except Exception as e:
+                    # One unusable event must not keep the server from starting
+                    print(f"⚠️  Skipped event {event['seq']} for player {player_id!r}: {e!r}", file=sys.stderr)
+                    continue
+                self._replace(player_id, player, replayed=event["seq"])
+            replayed += 1
+        self.flush()
+        return replayed
+
+    def scores(self):
+        self.flush()
+        return self.store.scores()
+
+    def zone_scores(self):
+        self.flush()
+        return self.store.zone_scores()
+
+    def import_json(self, path, player_id):
+        return self.store.import_json(path, player_id)
+
+    def create_session(self, player_id):
+        """Sessions are written through: a token works immediately and survives a crash"""
+        return self.store.create_session(player_id)
+
+    def session_player(self, token):
+        key = token_hash(token)
+        with self._lock:
+            player_id = self._sessions.get(key)
+            if player_id is not None:
+                self._sessions.move_to_end(key)
+                return player_id
+        player_id = self.store.session_player(token)
+        if player_id is not None:
+            with self._lock:
+                self._sessions[key] = player_id
+                if len(self._sessions) > self.capacity:
+                    self._sessions.popitem(last=False)
+        return player_id
+
+    def end_session(self, token):
+        with self._lock:
+            self._sessions.pop(token_hash(token), None)
+        self.store.end_session(token)
+
+    def adopt(self, player_id):
+        return self.store.adopt(player_id)
+
+    # ---------------------
+    # Flushing
+    # ---------------------
+    def dirty(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._players),
+                "capacity": self.capacity,
+                "dirty": len(self._dirty),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _requeue(self, ids, since):
+        """Mark players dirty again after a failed write; retried on the next flush"""
+        with self._lock:
+            self._dirty.update(ids)
+            for player_id in ids:
+                if player_id in since:
+                    seq = since[player_id]
+                    self._dirty_since[player_id] = min(seq, self._dirty_since.get(player_id, seq))
+
+    def _write_each(self, items, since):
+        """Write players one transaction each after a batch failed; returns those written
+
+        A player whose state the database refuses is reverted to what was last
+        stored (its unflushed events are dropped), so it can't block the
+        others. Database errors (locked, disk full) leave players dirty.
+        """
+        written = []
+        for item in items:
+            player_id, player = item[0], item[1]
+            try:
+                self.store.put_many([item])
+            except sqlite3.OperationalError:
+                self._requeue([player_id], since)
+                continue
+            except Exception as e:
+                print(f"⚠️  Player {player_id!r} could not be stored, reverted: {e!r}", file=sys.stderr)
+                with self._lock:
+                    if self._players.get(player_id) is player:
+                        del self._players[player_id]
+                        self._persisted.pop(player_id, None)
+                        self._seqs.pop(player_id, None)
+                        self._dirty.discard(player_id)
+                        self._dirty_since.pop(player_id, None)
+                    else:
+                        self._dirty.add(player_id)  # changed since: try the new state
+                continue
+            written.append(item)
+        return written
+
+    def flush(self):
+        """Write every dirty player in one transaction; returns how many were written
+
+        If the batch fails on a player's data rather than on the database,
+        players are written one by one so a bad record only affects itself.
+        """
+        with self._flush_lock:
+            with self._lock:
+                ids, self._dirty = self._dirty, set()
+                since = {pid: self._dirty_since.pop(pid) for pid in ids if pid in self._dirty_since}
+                items = [(pid, self._players[pid], self._persisted.get(pid), self._seqs.get(pid, 0)) for pid in ids]
+            if not items:
+                return 0
+            try:
+                self.store.put_many(items)
+            except sqlite3.OperationalError:
+                self._requeue(ids, since)
+                raise
+            except Exception:
+                items = self._write_each(items, since)
+            with self._lock:
+                for player_id, player, _, _ in items:
+                    if player_id in self._players:
+                        self._persisted[player_id] = player
+                self._evict()
+                if self.log is not None:
+                    # Every event before the oldest unflushed one is in the database
+                    snapshot_seq = min(self._dirty_since.values(), default=self.log.last_seq + 1) - 1
+            if self.log is not None:
+                self.log.compact(snapshot_seq)
+            return len(items)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️  Player flush failed: {e}", file=sys.stderr)
+
+    def close(self):
+        """Stop the background flusher, write everything still dirty and close the log"""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        if self.log is not None:
+            self.log.close()
@@ -0,0 +1,78 @@
+"""Pre-judge checks for sandbox escapes (run with: python -m pytest)"""
+
+import judge
+
+SUITE = judge.pack_tests([{"input": 1, "expected": 1}])
+
+
+def rejection(code):
+    return judge.prejudge(code, SUITE)
+
+
+def test_match_class_pattern_cannot_reach_dunders():
+    code = (
+        "def solve(n):\n"
+        "    match ():\n"
+        "        case object(__class__=t):\n"
+        "            pass\n"
+        "    match t:\n"
+        "        case object(__base__=b):\n"
+        "            pass\n"
+        "    return n\n"
+    )
+    assert "'__class__' is not allowed" in rejection(code)["error"]
+
+
+def test_match_class_pattern_cannot_reach_private_attributes():
+    code = (
+        "import collections\n"
+        "def solve(n):\n"
+        "    match collections:\n"
+        "        case object(_sys=s):\n"
+        "            return s\n"
+        "    return n\n"
+    )
+    assert "'_sys' is not allowed" in rejection(code)["error"]
+
+
+def test_match_class_pattern_on_public_attributes_is_allowed():
+    code = "def solve(n):\n    match n:\n        case int(real=r):\n            return r\n"
+    assert rejection(code) is None
+
+
+def test_recursive_generator_is_not_a_missing_base_case():
+    code = (
+        "def nat(i):\n"
+        "    yield i\n"
+        "    yield from nat(i + 1)\n"
+        "def solve(n):\n"
+        "    g = nat(0)\n"
+        "    return [next(g) for _ in range(n)][-1]\n"
+    )
+    assert rejection(code) is None
+
+
+def test_endless_loop_in_helper_caught_by_caller_is_allowed():
+    code = (
+        "def pop_all(xs):\n"
+        "    while True:\n"
+        "        xs.pop()\n"
+        "def solve(n):\n"
+        "    try:\n"
+        "        pop_all([n])\n"
+        "    except IndexError:\n"
+        "        return n\n"
+    )
+    assert rejection(code) is None
+
+
+def test_endless_loop_with_no_handler_on_any_path_is_rejected():
+    code = (
+        "def spin():\n"
+        "    while True:\n"
+        "        pass\n"
+        "def solve(n):\n"
+        "    spin()\n"
+        "    return n\n"
+    )
+    assert rejection(code)["error_type"] == "InfiniteLoop"